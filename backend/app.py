@@ -1,6 +1,7 @@
 import sys
 import os
 import time
+import secrets
 # Ensure yolov9 directory is in sys.path
 yolov9_path = os.path.join(os.path.dirname(__file__), "yolov9")
 if yolov9_path not in sys.path:
@@ -8,12 +9,28 @@ if yolov9_path not in sys.path:
 
 print(f"Current sys.path: {sys.path}")  # Debug print
 
-from flask import Flask, jsonify, request, send_from_directory, Response
-from models_tools import db, Snapshot, Blacklist,Settings
-from camera import Camera
-from utilsTool import save_snapshot, start_cleanup_thread
+from flask import Flask, jsonify, request, send_from_directory, Response, make_response
+from models_tools import db, Snapshot, Blacklist,Settings, SnapshotHourlyCount
+from camera_manager import CameraManager
+from frame_scheduler import AdaptiveScheduler
+from snapshot_writer import SnapshotWriter
+from blacklist_index import BlacklistIndex, embedding_to_bytes
+from stream_broadcaster import StreamHub
+from thumbnails import ensure_thumbnail, thumbnail_url
+from stats_service import StatsService
+from pagination import encode_cursor, after_cursor, order_keyset
+from snapshot_rollup import hourly_counts, rebuild_rollup
+from utilsTool import encode_face_image, encode_faces
+from retention import RetentionWorker, unlink_snapshot_files
+from snapshot_store import store_blacklist_image, migrate_flat_snapshots, migrate_blacklist_copies
 from config import Config
+from sqlite_tuning import configure_sqlite, serialized_write, write_stats
+from email_outbox import EmailOutbox, smtp_config
+from event_bus import EventBus, SocketIOForwarder
+from inference_ipc import InferenceHub, WorkerChannel, default_address, parse_address
+from metrics import REGISTRY, CAMERA_CONNECTED, FACES_DETECTED, FRAME_TO_EVENT_SECONDS, SNAPSHOT_QUEUE_DEPTH, render_families, with_labels
 import threading
+import atexit
 import face_recognition
 import cv2
 import datetime
@@ -24,12 +41,6 @@ from sqlalchemy import inspect,text
 from flask_socketio import SocketIO, emit
 from yolo_detector import YOLOv9FaceDetector
 import torch
-import shutil
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.base import MIMEBase
-from email import encoders
 
 # Configure logging
 logging.basicConfig(
@@ -50,12 +61,92 @@ YOLOV9_CONFIG = {
     "confidence_threshold": 0.6,
     "nms_threshold": 0.4,
     "face_class_id": 0,
-    "frame_skip_interval": 15,  # Increased to skip more frames
-    "input_size": 320  # Single integer to allow dynamic aspect ratio
+    "frame_skip_interval": 15,  # Used only when adaptive scheduling is disabled
+    "input_size": 320,  # Single integer to allow dynamic aspect ratio
+    "adaptive_scheduling": True,
+    "input_sizes": [640, 480, 416, 320, 256],  # Sizes the scheduler may step between
+    "active_interval": 0.2,  # Seconds between analyses while faces are present
+    "idle_interval": 2.0,  # Seconds between analyses on an idle camera
+    "latency_budget": 1.0,  # Seconds per detector batch before the input size is reduced
+    "motion_gating": True,  # Only run YOLO on frames that changed
+    "motion_sensitivity": 0.005,  # Default fraction of changed pixels needed to pass the gate
+    "tracking": True,  # One snapshot per tracked face instead of one per analysed frame
+    "track_iou_threshold": 0.3,
+    "track_max_misses": 5,  # Analysed frames a track survives without a matching detection
+    "track_max_age": 45.0,  # Seconds since last seen; above the motion gate keepalive (30 s)
+    "snapshot_on_best_quality": True,  # Refresh a track's snapshot when the face is seen better
+    "encoding_box_padding": 0.0  # Fraction of the YOLO box added on each side before face encoding
 }
 
+# Background snapshot writer configuration
+SNAPSHOT_WRITER_CONFIG = {
+    "maxsize": 64,  # Pending new snapshots before the full-queue policy applies
+    "batch_size": 32,  # Snapshot rows inserted per transaction
+    "flush_interval": 0.5,  # Seconds to let a burst accumulate before writing
+    "full_policy": "drop_newest"  # Or "drop_oldest"
+}
+
+# Live MJPEG stream configuration, shared by all clients of a camera
+STREAM_CONFIG = {
+    "fps": 10,  # Encoded frames per second per camera
+    "jpeg_quality": 70,
+    "max_width": 960,  # Frames wider than this are downscaled before encoding
+    "overlays": False  # Whether detections are drawn by default; clients can override with ?overlays=1
+}
+
+# Snapshot retention cleanup; the retention period itself comes from settings
+RETENTION_CONFIG = {
+    "interval": 3600,  # Seconds between retention passes
+    "chunk_size": 500,  # Snapshots deleted per transaction
+    "unlink_workers": 4,  # Threads removing image files
+    "checkpoint_path": "instance/retention_checkpoint.json"
+}
+
+# Outgoing email queue; SMTP server and login come from settings
+EMAIL_OUTBOX_CONFIG = {
+    "digest_window": 60,  # Seconds blacklist alerts are held so a burst becomes one digest
+    "idle_timeout": 60,  # Seconds an unused SMTP connection is kept open
+    "max_attempts": 5,
+    "attachment_max_width": 1280,  # Attached images are downscaled to this width
+    "sent_retention": 7 * 24 * 3600  # Seconds sent emails are kept in the outbox table
+}
+
+# Blacklist lookup index configuration
+BLACKLIST_INDEX_CONFIG = {
+    "backend": "exact",  # "ivf" for watchlists of tens of thousands of identities
+    "path": "instance/blacklist_index",  # Saved layout, memory-mapped on the next start
+    "options": {}  # Backend options, e.g. {"nprobe": 8} for "ivf"
+}
+
+
+# Deployment mode: "in_process" runs capture and inference on threads of this process;
+# "worker" runs them in separate inference worker processes and this process only
+# serves the API, consuming their results over a local IPC socket
+PIPELINE_CONFIG = {
+    "mode": os.environ.get('PIPELINE_MODE', 'in_process'),
+    "workers": int(os.environ.get('PIPELINE_WORKERS', 1)),  # Cameras are split across workers
+    "spawn_workers": os.environ.get('PIPELINE_SPAWN_WORKERS', '1') != '0',  # 0: started by inference_worker.py
+    # A Unix socket only this user can open where available, else TCP on localhost
+    "address": parse_address(os.environ.get('PIPELINE_ADDRESS') or default_address()),
+    # Messages are pickled, so the key is what keeps other local processes out. Spawned
+    # workers get a fresh random key per run; externally started ones need PIPELINE_AUTHKEY
+    "authkey": os.environ.get('PIPELINE_AUTHKEY', '').encode(),
+    "status_interval": 2.0,  # Seconds between worker status reports
+    # Workers publish decoded frames to shared-memory rings that this process's stream
+    # encoders read, so each camera is opened and decoded once, by its worker
+    "frame_rings": os.environ.get('PIPELINE_FRAME_RINGS', '1') != '0',
+    "ring_prefix": os.environ.get('PIPELINE_RING_PREFIX', 'facedet')
+}
+# "all" (in_process mode), "web" or "worker"; inference_worker.py sets "worker"
+PIPELINE_ROLE = os.environ.get('PIPELINE_ROLE', 'web' if PIPELINE_CONFIG["mode"] == 'worker' else 'all')
+RUNS_INFERENCE = PIPELINE_ROLE in ('all', 'worker')
+if PIPELINE_ROLE != 'all' and not PIPELINE_CONFIG["authkey"]:
+    if PIPELINE_ROLE == 'web' and PIPELINE_CONFIG["spawn_workers"]:
+        PIPELINE_CONFIG["authkey"] = secrets.token_hex(32).encode()
+    else:
+        raise RuntimeError("PIPELINE_AUTHKEY must be set when inference workers are started separately.")
 
-# Initialize YOLOv9FaceDetector
+# Initialize YOLOv9FaceDetector (only in processes that run inference)
 yolo_detector = YOLOv9FaceDetector(
     weights_path=YOLOV9_CONFIG["weights_path"],
     device=YOLOV9_CONFIG["device"],
@@ -63,7 +154,7 @@ yolo_detector = YOLOv9FaceDetector(
     nms_threshold=YOLOV9_CONFIG["nms_threshold"],
     face_class_id=YOLOV9_CONFIG["face_class_id"],
     input_size=YOLOV9_CONFIG["input_size"]
-)
+) if RUNS_INFERENCE else None
 
 app = Flask(__name__)
 CORS(app, resources={
@@ -86,6 +177,9 @@ CORS(app, resources={
 
 app.config.from_object(Config)
 db.init_app(app)
+with app.app_context():
+    # WAL, relaxed fsync and a busy timeout on every pooled connection
+    configure_sqlite(db.engine)
 print(f"Database URI: {app.config['SQLALCHEMY_DATABASE_URI']}")
 import os
 
@@ -94,6 +188,87 @@ print(f"Backend Database Path: {os.path.abspath(Config.SQLALCHEMY_DATABASE_URI.r
 # Initialize SocketIO
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+# Pipeline events (snapshots, detections, dashboard stats) are published here and pushed
+# to subscribed sockets as coalesced bundles, with at most one unacknowledged bundle each
+event_bus = EventBus()
+live_forwarder = SocketIOForwarder(socketio, event_bus)
+
+# Encodes, writes and commits snapshots off the camera processing thread
+snapshot_writer = SnapshotWriter(app, **SNAPSHOT_WRITER_CONFIG)
+if RUNS_INFERENCE:
+    SNAPSHOT_QUEUE_DEPTH.set_function(lambda: snapshot_writer.stats()['queue_depth'])
+
+# Dashboard aggregates kept in memory and pushed to clients when they change
+stats_service = StatsService()
+snapshot_writer.add_listener(stats_service.snapshots_added)
+stats_service.add_listener(lambda data: event_bus.publish('dashboard_stats', data))
+
+# Deletes expired snapshots in bounded chunks and keeps the counters and rollup in step
+retention_worker = RetentionWorker(
+    app,
+    retention_days=lambda: settings.get('snapshot_retention_days'),
+    max_bytes=lambda: float(settings.get('snapshot_max_gb') or 0) * 1024 ** 3,
+    **RETENTION_CONFIG
+)
+retention_worker.add_listener(lambda rows: stats_service.snapshots_deleted(len(rows)))
+snapshot_writer.add_listener(retention_worker.snapshots_added)
+snapshot_writer.add_resize_listener(retention_worker.snapshots_resized)
+
+# Persistent email queue sent in the background over one reused SMTP connection
+email_outbox = EmailOutbox(app, settings=lambda: settings, **EMAIL_OUTBOX_CONFIG)
+
+# Blacklist face embeddings, loaded once and updated as entries are added or removed
+blacklist_index = BlacklistIndex(
+    backend=BLACKLIST_INDEX_CONFIG["backend"],
+    path=BLACKLIST_INDEX_CONFIG["path"],
+    **BLACKLIST_INDEX_CONFIG["options"]
+)
+
+# Adapts analysis rate and input size to measured latency, CPU headroom and activity
+scheduler = AdaptiveScheduler(
+    yolo_detector,
+    input_sizes=YOLOV9_CONFIG["input_sizes"],
+    active_interval=YOLOV9_CONFIG["active_interval"],
+    idle_interval=YOLOV9_CONFIG["idle_interval"],
+    latency_budget=YOLOV9_CONFIG["latency_budget"]
+) if YOLOV9_CONFIG["adaptive_scheduling"] and RUNS_INFERENCE else None
+
+# All camera sources share the single yolo_detector instance
+camera_manager = CameraManager(
+    frame_skip_interval=YOLOV9_CONFIG["frame_skip_interval"],
+    scheduler=scheduler,
+    motion_gating=YOLOV9_CONFIG["motion_gating"],
+    motion_sensitivity=YOLOV9_CONFIG["motion_sensitivity"],
+    tracking=YOLOV9_CONFIG["tracking"],
+    tracker_options={
+        'iou_threshold': YOLOV9_CONFIG["track_iou_threshold"],
+        'max_misses': YOLOV9_CONFIG["track_max_misses"],
+        'max_age': YOLOV9_CONFIG["track_max_age"],
+        'quality_updates': YOLOV9_CONFIG["snapshot_on_best_quality"],
+    },
+    frame_rings={'web': 'consume', 'worker': 'publish'}.get(PIPELINE_ROLE) if PIPELINE_CONFIG["frame_rings"] else None,
+    ring_prefix=PIPELINE_CONFIG["ring_prefix"]
+)
+
+# Encodes each camera's stream once for all /api/stream clients
+stream_hub = StreamHub(camera_manager, **STREAM_CONFIG)
+
+# Web end of the worker IPC channel (PIPELINE_MODE=worker only): worker results feed the
+# same counters, retention accounting and live event bus as the in-process pipeline
+inference_hub = None
+if PIPELINE_ROLE == 'web':
+    inference_hub = InferenceHub(PIPELINE_CONFIG["address"], PIPELINE_CONFIG["authkey"])
+
+    def on_worker_snapshot_rows(rows):
+        stats_service.snapshots_added(rows)
+        retention_worker.snapshots_added(rows)
+
+    inference_hub.on('snapshot_rows', on_worker_snapshot_rows)
+    inference_hub.on('snapshot_resized', retention_worker.snapshots_resized)
+    inference_hub.on('event', event_bus.publish)
+    event_bus.subscribe('detections', lambda topic, d: stream_hub.set_detections(
+        d['camera_id'], d['boxes'], d['scores'], d['captured_at']))
+
 
 # Global settings (to be persisted in a real application)
 def load_settings():
@@ -153,81 +328,156 @@ def setup_database():
                     print(f"  Could not fetch contents of table {table}: {e}")
 
         # Ensure all required tables exist
-        required_tables = {'snapshots', 'blacklist', 'settings'}  # Include 'settings'
+        required_tables = {'snapshots', 'blacklist', 'settings', 'snapshot_hourly_counts', 'email_outbox'}  # Include 'settings'
         missing_tables = required_tables - set(tables)
 
         if missing_tables:
             print(f"Creating missing tables: {missing_tables}")
             db.create_all()  # Create any missing tables
 
+        # Add columns and indexes introduced after the tables were first created
+        migrate_columns()
+        migrate_indexes()
+
+        # Link blacklist entries that predate snapshot_id to their source snapshot by file name
+        db.session.execute(text(
+            "UPDATE blacklist SET snapshot_id = (SELECT snapshots.id FROM snapshots WHERE snapshots.image_path = "
+            "'static/snapshots/' || substr(blacklist.image_path, length('static/blacklist/') + 1)) "
+            "WHERE snapshot_id IS NULL AND image_path LIKE 'static/blacklist/%'"
+        ))
+        db.session.commit()
+
+        # Fill the hourly rollup once for databases that predate it
+        if SnapshotHourlyCount.query.first() is None and Snapshot.query.first() is not None:
+            print(f"Built hourly snapshot rollup: {rebuild_rollup()} buckets")
+
         # Ensure directories exist
         os.makedirs('static/snapshots', exist_ok=True)
         os.makedirs('static/blacklist', exist_ok=True)
+        os.makedirs('static/thumbnails', exist_ok=True)
 
         # Initialize default settings if not present
         initialize_default_settings()
 
 
+# Columns added to existing tables since the first release: table -> {column: DDL type}
+COLUMN_MIGRATIONS = {
+    'snapshots': {'camera_id': 'VARCHAR(64)', 'track_id': 'INTEGER', 'size_bytes': 'INTEGER'},
+    'blacklist': {'embedding': 'BLOB', 'snapshot_id': 'INTEGER'},
+}
+
+
+def migrate_columns():
+    """Add any missing columns from COLUMN_MIGRATIONS to existing tables in place."""
+    inspector = inspect(db.engine)
+    for table, columns in COLUMN_MIGRATIONS.items():
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        for name, ddl_type in columns.items():
+            if name not in existing:
+                print(f"Adding column {table}.{name}")
+                db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}"))
+    db.session.commit()
+
+
+def match_new_tracks(item, events):
+    """Encode the faces of newly seen tracks and match them against the blacklist index."""
+    if not len(blacklist_index):
+        return
+    new_tracks = [(track, box) for event, track, box, _ in events if event == 'new']
+    if not new_tracks:
+        return
+
+    # YOLO boxes are passed as known face locations: no second face detector, one call per frame
+    tracks = [track for track, _ in new_tracks]
+    encodings = encode_faces(item.frame, [box for _, box in new_tracks],
+                             padding=YOLOV9_CONFIG["encoding_box_padding"])
+
+    threshold = float(settings.get('match_threshold', 0.6))
+    for track, match in zip(tracks, blacklist_index.match(encodings, threshold)):
+        track.blacklist_match = match
+        if match:
+            entry_id, name, distance = match
+            log_event(f"[{item.camera_id}] Blacklist match: track {track.track_id} -> "
+                      f"entry {entry_id} ({name}), distance {distance:.3f}")
+
+
+def queue_blacklist_alert(item, track):
+    """Queue an email alert for a blacklisted track; alerts within the digest window go out together."""
+    recipient = settings.get('alert_email')
+    if not recipient or str(settings.get('email_notifications')).lower() not in ('true', '1', 'yes'):
+        return
+    entry_id, name, distance = track.blacklist_match
+    email_outbox.enqueue(
+        recipient,
+        subject='Blacklisted Face Detected',
+        body=f"Camera {item.camera_id}: blacklist entry {entry_id} ({name or 'unnamed'}) "
+             f"matched track {track.track_id}, distance {distance:.3f}.",
+        attachments=[track.snapshot] if track.snapshot else [],
+        digest_key='blacklist_alert',
+    )
+
+
+def migrate_indexes():
+    """Create any index declared on the models that an existing database does not have yet."""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            # checkfirst makes this CREATE INDEX IF NOT EXISTS, so it is safe on every start
+            index.create(bind=db.engine, checkfirst=True)
+
+
 def camera_processing_thread():
-    global yolo_detector, camera  # Ensure camera can be dynamically updated
-    retry_count = 0
-    frame_count = 0
-    frame_skip_interval = YOLOV9_CONFIG["frame_skip_interval"]
+    global yolo_detector  # Cameras are owned by camera_manager and may change at runtime
 
     # Warm-up the model
     yolo_detector.warm_up()
 
     while True:
         try:
-            log_event("Attempting to retrieve a frame from the camera...")
-
-            # Fetch a frame from the camera
-            frame = camera.get_frame()
-            if frame is not None:
-                print(f"Original frame dimensions: width={frame.shape[1]}, height={frame.shape[0]}")
-            else:
-                log_event("Received None frame from camera.")
-                retry_count += 1
-                if retry_count > 5:
-                    log_event("Camera reconnection failed. Exiting thread.")
-                    break
-                time.sleep(2 ** retry_count)  # Exponential backoff
-                continue
-
-            retry_count = 0  # Reset retry count if a valid frame is received
-            frame_count += 1
-
-            # Skip frames based on the configured interval
-            if frame_count % frame_skip_interval != 0:
-                log_event(f"Skipping frame {frame_count} (not a target frame for analysis).")
+            # Newest due frame from every camera; one batched forward pass per tick
+            batch = camera_manager.next_batch(timeout=5)
+            if not batch:
+                log_event("No new frames from any camera.")
                 continue
 
-            log_event("Processing frame for face detection...")
+            # Per-frame timings go to the metrics registry (/api/metrics), not to the log
             try:
-                # Detect faces
-                detection_start = time.time()
-                boxes, scores, fps = yolo_detector.detect_faces(frame)
-                detection_end = time.time()
-                detection_time = detection_end - detection_start
-                log_event(f"Calculated FPS: {fps:.2f}")
-                log_event(f"Detection time: {detection_time:.4f}s")
-
-                # Save snapshot with overlays if faces are detected
-                if boxes and scores:
-                    log_event(f"Detected faces: {boxes}")
-                    for box in boxes:
-                        log_event(f"Bounding box coordinates: {box}")
-
-                    frame_with_overlays = yolo_detector.draw_bounding_boxes(frame, boxes, scores)
-
-                    # Save snapshot to the database using app context
-                    with app.app_context():
-                        save_snapshot(frame_with_overlays)
-                else:
-                    log_event("No bounding boxes detected.")
-                    # Optionally save the frame without overlays
-                    # with app.app_context():
-                    #     save_snapshot(frame)
+                results = camera_manager.detect(yolo_detector, batch)
+
+                for item, boxes, scores in results:
+                    stream_hub.set_detections(item.camera_id, boxes, scores, item.captured_at)
+                    event_bus.publish('detections', {
+                        'camera_id': item.camera_id,
+                        'boxes': [[float(v) for v in box] for box in boxes],
+                        'scores': [float(score) for score in scores],
+                        'captured_at': item.captured_at,
+                        'motion_box': list(item.motion_box) if item.motion_box is not None else None,
+                    })
+                    FRAME_TO_EVENT_SECONDS.labels(item.camera_id).observe(time.time() - item.captured_at)
+                    events = camera_manager.track(item, boxes, scores)
+                    if not boxes:
+                        continue
+                    FACES_DETECTED.labels(item.camera_id).inc(len(boxes))
+
+                    if events is None:
+                        # Tracking disabled: save snapshot with overlays for every analysed frame
+                        frame_with_overlays = yolo_detector.draw_bounding_boxes(item.frame, boxes, scores)
+                        snapshot_writer.submit(frame_with_overlays, camera_id=item.camera_id)
+                        continue
+
+                    match_new_tracks(item, events)
+
+                    for event, track, box, score in events:
+                        frame_with_overlays = yolo_detector.draw_bounding_boxes(item.frame, [box], [score])
+                        if event == 'new':
+                            # One snapshot row per track, written when the face first appears
+                            track.snapshot = snapshot_writer.submit(
+                                frame_with_overlays, camera_id=item.camera_id, track_id=track.track_id
+                            )
+                            if track.blacklist_match:
+                                queue_blacklist_alert(item, track)
+                        elif track.snapshot:
+                            # Better view of a known face: refresh its image, no new row
+                            snapshot_writer.submit_rewrite(track.snapshot, frame_with_overlays)
 
             except Exception as e:
                 log_event(f"Error during face detection: {e}")
@@ -239,21 +489,6 @@ def camera_processing_thread():
 
 
 
-def save_snapshot(frame_with_overlays):
-    try:
-        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-        filename = f"static/snapshots/{timestamp}.jpg"
-        cv2.imwrite(filename, frame_with_overlays)
-        print(f"Snapshot successfully saved with overlays at {filename}")
-
-        # Save to database within application context
-        snapshot = Snapshot(image_path=filename, timestamp=datetime.datetime.utcnow())
-        db.session.add(snapshot)
-        db.session.commit()
-    except Exception as e:
-        print(f"Error saving snapshot: {e}")
-        raise
-
 def initialize_default_settings():
     defaults = {
         'camera_ip': '192.168.0.168',
@@ -261,10 +496,13 @@ def initialize_default_settings():
         'email_notifications': True,
         'match_threshold': 0.6,
         'snapshot_retention_days': 7,
+        'snapshot_max_gb': 0,  # Disk quota for snapshots; 0 disables it
         'smtp_server': 'smtp.example.com',
         'smtp_port': 587,
         'smtp_username': 'user@example.com',
-        'smtp_password': 'securepassword'
+        'smtp_password': 'securepassword',
+        'smtp_starttls': True,
+        'alert_email': ''  # Recipient of blacklist match alerts; empty disables them
     }
     for key, value in defaults.items():
         if not Settings.query.filter_by(key=key).first():
@@ -274,15 +512,17 @@ def initialize_default_settings():
 
 @app.route('/api/stream')
 def video_feed():
-    def generate():
-        while True:
-            frame = camera.get_frame()  # Assume this retrieves a frame from the camera
-            _, buffer = cv2.imencode('.jpg', frame)
-            frame = buffer.tobytes()
-            yield (b'--frame\r\n'
-                   b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-
-    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame')
+    """
+    MJPEG stream of one camera (?camera=<id>, default: first camera). All clients of
+    the same camera share one encoder; ?overlays=1 draws the latest detections.
+    """
+    camera_id = request.args.get('camera')
+    overlays = request.args.get('overlays')
+    overlays = overlays.lower() in ('1', 'true', 'yes') if overlays is not None else None
+    broadcaster = stream_hub.get(camera_id, overlays)
+    if broadcaster is None:
+        return jsonify({'message': 'Camera not found'}), 404
+    return Response(broadcaster.subscribe(), mimetype='multipart/x-mixed-replace; boundary=frame')
 
 @app.route('/api/dashboard', methods=['GET'])
 def get_dashboard_data():
@@ -290,19 +530,30 @@ def get_dashboard_data():
     Dashboard data route: Collects status and metrics from the application.
     """
     try:
-        camera_status = camera.cap.isOpened() if camera.cap else False
-        last_snapshot = Snapshot.query.order_by(Snapshot.timestamp.desc()).first()
-        blacklist_size = Blacklist.query.count()
-        total_snapshots = Snapshot.query.count()
+        if inference_hub is not None:
+            # Pipeline state as last reported by the worker processes
+            workers = inference_hub.worker_status()
+            cameras = {camera_id: status for w in workers.values() for camera_id, status in w['cameras'].items()}
+            writer_stats = {index: w['snapshot_writer'] for index, w in workers.items()}
+        else:
+            cameras = camera_manager.status()
+            writer_stats = snapshot_writer.stats()
+        camera_status = any(c['connected'] for c in cameras.values())
         data = {
             'camera_status': camera_status,
             'camera_ip': settings['camera_ip'],
-            'last_snapshot_time': last_snapshot.timestamp.strftime('%Y-%m-%d %H:%M:%S') if last_snapshot else None,
-            'last_snapshot_image': last_snapshot.image_path if last_snapshot else None,
+            'cameras': cameras,
+            'snapshot_writer': writer_stats,
+            'retention': retention_worker.stats(),
+            'database': write_stats(),
+            'email_outbox': email_outbox.stats(),
+            'live_clients': live_forwarder.stats(),
+            'streams': stream_hub.stats(),
+            'inference_workers': inference_hub.stats() if inference_hub is not None else None,
             'last_notification_time': None,  # Placeholder for actual implementation
-            'blacklist_size': blacklist_size,
-            'total_snapshots': total_snapshots
         }
+        # Counts and the latest snapshot come from memory, not from COUNT queries
+        data.update(stats_service.snapshot())
         return jsonify(data)
     except Exception as e:
         print(f"Error in /api/dashboard: {e}")
@@ -310,44 +561,84 @@ def get_dashboard_data():
 
 
 
+def refresh_camera_gauges():
+    """Point-in-time camera gauges, refreshed when metrics are collected rather than per frame."""
+    CAMERA_CONNECTED.clear()
+    for camera_id, status in camera_manager.status().items():
+        CAMERA_CONNECTED.labels(camera_id).set(int(status['connected']))
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Pipeline metrics in the Prometheus text format: per-stage latency histograms
+    (capture, queue wait, preprocessing, inference, NMS, encoding, database write,
+    frame-to-event) and counters, labelled per camera. In PIPELINE_MODE=worker the
+    workers' metrics are included with a worker label.
+    """
+    families = []
+    if RUNS_INFERENCE:
+        refresh_camera_gauges()
+    if inference_hub is not None:
+        for index, status in inference_hub.worker_status().items():
+            families.extend(with_labels(status.get('metrics', []), worker=index))
+    return Response(render_families(REGISTRY.collect() + families), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/scheduler', methods=['GET'])
+def get_scheduler_state():
+    """
+    Current frame scheduling decisions: input size, per-camera analysis intervals
+    and the latency / CPU measurements they are based on.
+    """
+    if inference_hub is not None:
+        return jsonify({'workers': {index: w['scheduler'] for index, w in inference_hub.worker_status().items()}})
+    if scheduler is None:
+        return jsonify({'adaptive': False, 'frame_skip_interval': YOLOV9_CONFIG["frame_skip_interval"]})
+    state = scheduler.state(camera_manager.camera_ids())
+    state['adaptive'] = True
+    return jsonify(state)
+
+
 @app.route('/api/settings', methods=['GET', 'POST'])
 def handle_settings():
-    global settings, camera  # Access the global Camera instance
+    global settings
 
     if request.method == 'POST':
         data = request.json
         settings_updated = False
 
-        for key, value in data.items():
-            setting = Settings.query.filter_by(key=key).first()
-            if setting:
-                setting.value = value
-            else:
-                new_setting = Settings(key=key, value=value)
-                db.session.add(new_setting)
+        with serialized_write():
+            for key, value in data.items():
+                setting = Settings.query.filter_by(key=key).first()
+                if setting:
+                    setting.value = value
+                else:
+                    new_setting = Settings(key=key, value=value)
+                    db.session.add(new_setting)
 
-            # Check if critical camera settings have changed
-            if key in ['camera_ip', 'camera_password'] and settings.get(key) != value:
-                settings_updated = True
+                # Check if critical camera settings have changed
+                if key in ['camera_ip', 'camera_password', 'cameras'] and settings.get(key) != value:
+                    settings_updated = True
 
-        db.session.commit()
+            db.session.commit()
 
         # Reload settings into the global variable
         load_settings()
 
         # If camera settings changed, reconnect asynchronously
         if settings_updated:
-            log_event("Reinitializing Camera in a separate thread...")
-            def reconnect_camera():
-                global camera
+            log_event("Reloading cameras in a separate thread...")
+            def reconnect_cameras():
                 try:
-                    camera = Camera(settings['camera_ip'], settings['camera_password'])
-                    camera.connect()  # Attempt to reconnect
-                    log_event("Camera reconnected successfully.")
+                    camera_manager.load(settings)
+                    if inference_hub is not None:
+                        inference_hub.broadcast('reload_settings')
+                    log_event(f"Cameras reloaded: {camera_manager.camera_ids()}")
                 except Exception as e:
-                    log_event(f"Failed to reconnect camera: {e}")
+                    log_event(f"Failed to reload cameras: {e}")
 
-            threading.Thread(target=reconnect_camera, daemon=True).start()
+            threading.Thread(target=reconnect_cameras, daemon=True).start()
 
         return jsonify({'message': 'Settings updated'})
 
@@ -358,6 +649,12 @@ def handle_settings():
 def get_paginated_items(item_type):
     """
     Unified route for fetching paginated snapshots or blacklist items.
+
+    Two modes share the same filters:
+    - page=<n>: classic offset pagination, exact total by default (existing clients).
+    - cursor=<next_cursor>: keyset pagination on (timestamp, id); deep pages cost the
+      same as the first. No total unless count=exact or count=approximate.
+    Every response carries next_cursor for the following page (null on the last one).
     """
     if item_type not in ['snapshot', 'blacklist']:
         return jsonify({"error": "Invalid type"}), 400
@@ -367,31 +664,57 @@ def get_paginated_items(item_type):
     try:
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 10))
+        cursor = request.args.get('cursor')
+        count_mode = request.args.get('count', 'none' if cursor else 'exact')
+        if count_mode not in ('exact', 'approximate', 'none'):
+            return jsonify({"error": "count must be exact, approximate or none"}), 400
         sort_order = request.args.get('sort', 'desc')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
+        camera_id = request.args.get('camera_id')
 
         query = model.query
 
+        # Snapshots can be narrowed down to a single camera
+        if camera_id and item_type == 'snapshot':
+            query = query.filter(model.camera_id == camera_id)
+
         # Handle date filters
+        filtered = bool(camera_id and item_type == 'snapshot')
         if start_date and end_date:
             start = datetime.datetime.strptime(start_date, '%Y-%m-%d')
             end = datetime.datetime.strptime(end_date, '%Y-%m-%d') + datetime.timedelta(days=1)
             query = query.filter(model.timestamp >= start, model.timestamp < end)
+            filtered = True
 
         # If no dates provided (All Time)
         if not start_date and not end_date:
             pass  # No filtering on dates for "All Time"
 
-        # Sort order
-        if sort_order == 'asc':
-            query = query.order_by(model.timestamp.asc())
+        # Totals are optional; unfiltered approximate totals come from the in-memory counters
+        if count_mode == 'exact' or (count_mode == 'approximate' and filtered):
+            total_items = query.order_by(None).count()
+        elif count_mode == 'approximate':
+            stats = stats_service.snapshot()
+            total_items = stats['total_snapshots'] if item_type == 'snapshot' else stats['blacklist_size']
         else:
-            query = query.order_by(model.timestamp.desc())
+            total_items = None
 
-        # Pagination
-        total_items = query.count()
-        items = query.offset((page - 1) * limit).limit(limit).all()
+        # Sort order, on (timestamp, id) to match the composite index
+        descending = sort_order != 'asc'
+        query = order_keyset(query, model, descending)
+
+        # Pagination: fetch one extra row to know whether another page exists
+        if cursor:
+            try:
+                query = after_cursor(query, model, cursor, descending)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        else:
+            query = query.offset((page - 1) * limit)
+        items = query.limit(limit + 1).all()
+        has_more = len(items) > limit
+        items = items[:limit]
 
         # Generate the response
         response_items = []
@@ -399,18 +722,23 @@ def get_paginated_items(item_type):
             item_data = {
                 'id': item.id,
                 'image_path': item.image_path,
+                'thumbnail_url': thumbnail_url(item.image_path),
                 'timestamp': item.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
             }
             # Add 'name' field for blacklist items
             if item_type == 'blacklist':
                 item_data['name'] = item.name
+            else:
+                item_data['camera_id'] = item.camera_id
+                item_data['track_id'] = item.track_id
             response_items.append(item_data)
 
         return jsonify({
             'items': response_items,
             'total': total_items,
-            'page': page,
-            'pages': (total_items + limit - 1) // limit,
+            'page': None if cursor else page,
+            'pages': (total_items + limit - 1) // limit if total_items is not None else None,
+            'next_cursor': encode_cursor(items[-1]) if has_more and items else None,
         })
 
     except Exception as e:
@@ -454,27 +782,23 @@ def get_snapshot_stats():
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
 
-        # Query base
-        query = db.session.query(
-            db.func.strftime("%Y-%m-%d %H", Snapshot.timestamp).label("hour"),
-            db.func.count(Snapshot.id).label("count")
-        )
+        camera_id = request.args.get('camera_id')
+        start = end = None
 
         # Handle date filters
         if start_date and end_date:
             start = datetime.datetime.strptime(start_date, '%Y-%m-%d')
             end = datetime.datetime.strptime(end_date, '%Y-%m-%d') + datetime.timedelta(days=1)
-            query = query.filter(Snapshot.timestamp >= start, Snapshot.timestamp < end)
         elif start_date or end_date:
             # If only one date is provided, return an error
             return jsonify({"error": "Both start_date and end_date must be provided"}), 400
         # No date filtering for "All Time"
 
-        # Group by hour
-        stats = query.group_by("hour").all()
+        # Read the hourly rollup: cost depends on the hours returned, not the snapshot count
+        stats = hourly_counts(start, end, camera_id)
 
         # Format results
-        stats_list = [{"hour": s[0], "count": s[1]} for s in stats]
+        stats_list = [{"hour": hour.strftime("%Y-%m-%d %H"), "count": int(count)} for hour, count in stats]
         return jsonify(stats_list)
 
     except Exception as e:
@@ -484,6 +808,29 @@ def get_snapshot_stats():
 
 
 
+@app.cli.command('rebuild-rollup')
+def rebuild_rollup_command():
+    """Recompute the hourly snapshot rollup from the snapshots table."""
+    print(f"Rebuilt hourly snapshot rollup: {rebuild_rollup()} buckets")
+
+
+@app.cli.command('cleanup-snapshots')
+def cleanup_snapshots_command():
+    """Run one retention pass now and print what it reclaimed."""
+    load_settings()
+    report = retention_worker.run_pass()
+    print(f"Deleted {report['items']} snapshots, freed {report['bytes']} bytes in {report['duration']:.2f}s")
+
+
+@app.cli.command('migrate-storage')
+def migrate_storage_command():
+    """Move flat snapshot files into hour shards and blacklist copies into the content-addressed store."""
+    setup_database()
+    with app.app_context():
+        print(f"Moved {migrate_flat_snapshots()} snapshots into hour shards")
+        print(f"Moved {migrate_blacklist_copies()} blacklist images into the content-addressed store")
+
+
 @app.route('/api/snapshot/<int:snapshot_id>/add_to_blacklist', methods=['POST'])
 def add_to_blacklist(snapshot_id):
     """
@@ -497,17 +844,25 @@ def add_to_blacklist(snapshot_id):
     image_path = snapshot.image_path
 
     try:
-        blacklist_dir = os.path.join(app.root_path, 'static', 'blacklist')
-        os.makedirs(blacklist_dir, exist_ok=True)
-
-        filename = os.path.basename(image_path)
-        new_path = os.path.join(blacklist_dir, filename)
-        shutil.copy(os.path.join(app.root_path, image_path), new_path)
-
-        web_path = f"static/blacklist/{filename}"
-        blacklist_entry = Blacklist(name=name, image_path=web_path, timestamp=snapshot.timestamp)
-        db.session.add(blacklist_entry)
-        db.session.commit()
+        # Hard link into the content-addressed store instead of copying the image
+        web_path = store_blacklist_image(image_path)
+
+        # Compute the face embedding once, here, instead of on every live match
+        embedding = encode_face_image(web_path)
+        blacklist_entry = Blacklist(name=name, image_path=web_path, timestamp=snapshot.timestamp,
+                                    snapshot_id=snapshot.id, embedding=embedding_to_bytes(embedding))
+        with serialized_write():
+            db.session.add(blacklist_entry)
+            db.session.commit()
+        stats_service.blacklist_changed(+1)
+
+        if embedding is not None:
+            if RUNS_INFERENCE:
+                blacklist_index.add(blacklist_entry.id, name, embedding)
+            if inference_hub is not None:
+                inference_hub.broadcast('blacklist_add', blacklist_entry.id, name, embedding)
+        else:
+            print(f"No face found in {web_path}; blacklist entry {blacklist_entry.id} is not matchable.")
 
         return jsonify({'message': 'Snapshot added to blacklist', 'blacklist_path': web_path})
     except Exception as e:
@@ -529,8 +884,17 @@ def remove_item(item_type, item_id):
     if not item:
         return jsonify({'message': 'Blacklist entry not found'}), 404
 
-    db.session.delete(item)
-    db.session.commit()
+    with serialized_write():
+        db.session.delete(item)
+        db.session.commit()
+    # Identical images share one stored file; drop it with the last entry that uses it
+    if not Blacklist.query.filter_by(image_path=item.image_path).first():
+        unlink_snapshot_files(item.image_path)
+    stats_service.blacklist_changed(-1)
+    if RUNS_INFERENCE:
+        blacklist_index.remove(item_id)
+    if inference_hub is not None:
+        inference_hub.broadcast('blacklist_remove', item_id)
     return jsonify({'message': f'{item_type.capitalize()} entry removed successfully.'})
 
 
@@ -538,6 +902,29 @@ def remove_item(item_type, item_id):
 
 
 
+@app.route('/api/thumbnails/<path:image_path>')
+def get_thumbnail(image_path):
+    """
+    Serve the thumbnail of a stored image, generating and caching it on disk on first
+    request. Requests versioned with ?v= are cacheable forever.
+    """
+    image_path = os.path.normpath(image_path).replace(os.sep, '/')
+    if not image_path.startswith('static/') or image_path.startswith('static/thumbnails/') or '..' in image_path:
+        return jsonify({'message': 'Invalid image path'}), 400
+
+    path = ensure_thumbnail(image_path)
+    if path is None:
+        return jsonify({'message': 'Image not found'}), 404
+
+    response = make_response(send_from_directory(os.path.dirname(path), os.path.basename(path)))
+    if request.args.get('v'):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'public, max-age=3600'
+    response.headers['Ngrok-Skip-Browser-Warning'] = 'true'
+    return response
+
+
 @app.route('/static/<path:filename>')
 def static_files(filename):
     # Serve the static file
@@ -552,15 +939,40 @@ def static_files(filename):
 @socketio.on('connect')
 def handle_connect():
     print("Client connected")
+    live_forwarder.connect(request.sid)
+
+@socketio.on('disconnect')
+def handle_disconnect():
+    live_forwarder.disconnect(request.sid)
+
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """
+    Choose what this socket receives in 'live_update' bundles:
+    {"topics": ["snapshots", "detections", "dashboard_stats"], "cameras": ["front", ...]}.
+    Omitted topics keep the defaults (snapshots and dashboard_stats); omitted cameras mean all.
+    """
+    data = data or {}
+    live_forwarder.subscribe(request.sid, data.get('topics'), data.get('cameras'))
 
 def notify_snapshot_update(snapshot):
-    """Notify clients of a new snapshot."""
-    socketio.emit('snapshot_update', {
-        'id': snapshot.id,
-        'image_path': snapshot.image_path,
-        'timestamp': snapshot.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+    """Publish a committed snapshot row (dict from the snapshot writer) to live clients."""
+    event_bus.publish('snapshots', {
+        'id': snapshot['id'],
+        'image_path': snapshot['image_path'],
+        'thumbnail_url': thumbnail_url(snapshot['image_path']),
+        'camera_id': snapshot.get('camera_id'),
+        'track_id': snapshot.get('track_id'),
+        'timestamp': snapshot['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
     })
 
+def notify_snapshot_rows(rows):
+    for row in rows:
+        notify_snapshot_update(row)
+
+# New snapshots are pushed to clients instead of being polled from the REST endpoints
+snapshot_writer.add_listener(notify_snapshot_rows)
+
 @app.route('/api/<string:item_type>/<int:item_id>/email', methods=['POST'])
 def email_item(item_type, item_id):
     """
@@ -576,15 +988,8 @@ def email_item(item_type, item_id):
         return jsonify({'message': f'{item_type.capitalize()} not found'}), 404
 
     try:
-        # Fetch email settings
-        settings = {s.key: s.value for s in Settings.query.all()}
-        smtp_server = settings.get('smtp_server')
-        smtp_port = settings.get('smtp_port')
-        smtp_username = settings.get('smtp_username')
-        smtp_password = settings.get('smtp_password')
-
         # Ensure SMTP settings are configured
-        if not (smtp_server and smtp_port and smtp_username and smtp_password):
+        if smtp_config(settings) is None:
             return jsonify({'message': 'SMTP settings are not configured properly.'}), 500
 
         # Extract recipient email from the request
@@ -593,37 +998,17 @@ def email_item(item_type, item_id):
         if not recipient_email:
             return jsonify({'message': 'Recipient email is required.'}), 400
 
-        # Prepare the email
-        subject = f"{item_type.capitalize()} Item"
-        body = f"Please find the attached {item_type} item."
-        msg = MIMEMultipart()
-        msg['From'] = smtp_username
-        msg['To'] = recipient_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(body, 'plain'))
-
-        # Attach the item file
-        attachment_path = os.path.join(app.root_path, item.image_path)
-        if os.path.exists(attachment_path):
-            with open(attachment_path, 'rb') as attachment:
-                part = MIMEBase('application', 'octet-stream')
-                part.set_payload(attachment.read())
-                encoders.encode_base64(part)
-                part.add_header(
-                    'Content-Disposition',
-                    f'attachment; filename={os.path.basename(attachment_path)}'
-                )
-                msg.attach(part)
-        else:
+        if not os.path.exists(email_outbox.resolve_path(item.image_path)):
             return jsonify({'message': f'{item_type.capitalize()} file not found on server.'}), 404
 
-        # Send the email
-        with smtplib.SMTP(smtp_server, int(smtp_port)) as server:
-            server.starttls()
-            server.login(smtp_username, smtp_password)
-            server.sendmail(smtp_username, recipient_email, msg.as_string())
-
-        return jsonify({'message': f'Email sent to {recipient_email} successfully.'})
+        # Queue the email; the outbox worker sends it over its open SMTP connection
+        email_outbox.enqueue(
+            recipient_email,
+            subject=f"{item_type.capitalize()} Item",
+            body=f"Please find the attached {item_type} item.",
+            attachments=[item.image_path],
+        )
+        return jsonify({'message': f'Email to {recipient_email} queued successfully.'}), 202
 
     except Exception as e:
         print(f"Error in /email_item: {e}")
@@ -631,6 +1016,67 @@ def email_item(item_type, item_id):
 
 
 
+def worker_status():
+    """Status a worker process reports to the web process."""
+    state = scheduler.state(camera_manager.camera_ids()) if scheduler is not None else {'adaptive': False}
+    refresh_camera_gauges()
+    return {
+        'cameras': camera_manager.status(),
+        'scheduler': state,
+        'snapshot_writer': snapshot_writer.stats(),
+        'metrics': REGISTRY.collect(),
+    }
+
+
+def run_inference_worker(index, count, address, authkey):
+    """
+    Main loop of inference worker `index` of `count` (PIPELINE_ROLE=worker): captures
+    and analyses its share of the cameras, writes snapshots, and sends results and
+    status to the web process over the IPC channel. Exits when the web process goes away.
+    """
+    def shutdown():
+        # os._exit skips atexit: flush queued snapshots here. Shared-memory rings outlive
+        # the process unless unlinked
+        snapshot_writer.stop()
+        camera_manager.close_rings()
+        os._exit(0)
+
+    channel = WorkerChannel(address, authkey, index, on_close=shutdown)
+    load_settings()
+
+    # Only the first worker saves the shared index layout; the others just read it
+    if index:
+        blacklist_index.path = None
+    with app.app_context():
+        blacklist_index.load()
+
+    # Everything the web process accounts for or pushes to clients goes over the channel
+    snapshot_writer.add_listener(lambda rows: channel.send('snapshot_rows', rows))
+    snapshot_writer.add_resize_listener(lambda delta: channel.send('snapshot_resized', delta))
+    for topic in ('snapshots', 'detections'):
+        event_bus.subscribe(topic, lambda topic, payload: channel.send('event', topic, payload))
+
+    def reload_settings():
+        load_settings()
+        camera_manager.load(settings)
+
+    channel.on('blacklist_add', blacklist_index.add)
+    channel.on('blacklist_remove', blacklist_index.remove)
+    channel.on('reload_settings', reload_settings)
+    channel.start()
+
+    camera_manager.shard = (index, count)
+    camera_manager.load(settings)
+    snapshot_writer.start()
+    atexit.register(snapshot_writer.stop)
+    threading.Thread(target=camera_processing_thread, daemon=True).start()
+    log_event(f"Inference worker {index}/{count} running cameras {camera_manager.camera_ids()}")
+
+    while True:
+        channel.send('status', worker_status())
+        time.sleep(PIPELINE_CONFIG["status_interval"])
+
+
 # Confirm thread starts in __main__
 if __name__ == '__main__':
     setup_database()
@@ -638,9 +1084,14 @@ if __name__ == '__main__':
     # Load settings into global variable
     load_settings()
 
-    # Initialize the camera after loading settings
-    global camera
-    camera = Camera(settings['camera_ip'], settings['camera_password'])
+    # Build the in-memory blacklist embedding index and seed the dashboard counters
+    with app.app_context():
+        if RUNS_INFERENCE:
+            blacklist_index.load()
+        stats_service.seed()
+
+    # Start every configured camera after loading settings
+    camera_manager.load(settings)
 
     # Print all registered routes
     print("Registered routes:")
@@ -649,11 +1100,27 @@ if __name__ == '__main__':
 
     # Create threads with app context
     with app.app_context():
-        print("Starting cleanup thread...")
-        threading.Thread(target=start_cleanup_thread, args=(settings['snapshot_retention_days'],), daemon=True).start()
+        print("Starting retention worker...")
+        retention_worker.start()
+
+        print("Starting email outbox...")
+        email_outbox.start()
+
+        if inference_hub is not None:
+            # Capture, inference and snapshot writes run in the worker processes
+            print(f"Starting inference IPC on {PIPELINE_CONFIG['address']}...")
+            inference_hub.start()
+            if PIPELINE_CONFIG["spawn_workers"]:
+                worker_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'inference_worker.py')
+                inference_hub.spawn_workers(worker_script, PIPELINE_CONFIG["workers"])
+        else:
+            print("Starting snapshot writer...")
+            snapshot_writer.start()
+            # Write whatever is still queued when the server stops
+            atexit.register(snapshot_writer.stop)
 
-        print("Starting camera processing thread...")
-        threading.Thread(target=camera_processing_thread, daemon=True).start()
+            print("Starting camera processing thread...")
+            threading.Thread(target=camera_processing_thread, daemon=True).start()
 
     app.run(debug=True, use_reloader=False)
 
@@ -0,0 +1,180 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from face_index import create_index, load_index
+from models_tools import db, Blacklist
+from utilsTool import encode_face_image
+
+EMBEDDING_DIM = 128
+
+# Stored in Blacklist.embedding when the image has no detectable face, so it is not retried
+NO_FACE = b''
+
+
+def embedding_to_bytes(embedding):
+    return np.asarray(embedding, dtype=np.float32).tobytes() if embedding is not None else NO_FACE
+
+
+def embedding_from_bytes(data):
+    return np.frombuffer(data, dtype=np.float32)
+
+
+def embedding_fingerprint(data):
+    """64-bit hash of stored embedding bytes; tells a reused row id from the entry it replaced."""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little', signed=True)
+
+
+class BlacklistIndex:
+    """
+    Blacklist face embeddings kept in a face_index backend for real-time matching.
+
+    Embeddings are computed once when an entry is added and persisted in
+    `Blacklist.embedding`. `backend` selects the lookup structure: 'exact' scans all
+    entries with one vectorized distance computation, 'ivf' is approximate and scales
+    to very large watchlists. With a `path`, the index layout is saved there and
+    memory-mapped on the next start; the database stays the source of truth. The save
+    records a fingerprint of every indexed embedding, so at load time only entries that
+    were added, removed or replaced (SQLite reuses the highest row id after a delete)
+    are reconciled. Runtime changes are saved `save_delay` seconds later, batched.
+    """
+
+    def __init__(self, backend='exact', path=None, save_delay=5.0, **options):
+        self.backend = backend
+        self.path = path
+        self.save_delay = save_delay
+        self.options = options
+        self.index = create_index(backend, dim=EMBEDDING_DIM, **options)
+        self.names = {}
+        self.fingerprints = {}
+        self.update_lock = threading.Lock()
+        self.save_timer = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def load(self):
+        """Open the saved index, reconcile it with the database and save it back. Needs an app context."""
+        with self.update_lock:
+            self._load()
+
+    def _open_saved_index(self):
+        if not self.path or not os.path.exists(os.path.join(self.path, "meta.json")):
+            return None, {}
+        try:
+            index = load_index(self.path, mmap=True)
+            pairs = np.load(os.path.join(self.path, "fingerprints.npy"))
+        except Exception as e:
+            print(f"Could not open saved blacklist index at {self.path}: {e}")
+            return None, {}
+        if index.kind != self.backend:
+            return None, {}
+        return index, {int(entry_id): int(fingerprint) for entry_id, fingerprint in pairs}
+
+    def _load(self):
+        index, saved = self._open_saved_index()
+        if index is None:
+            index = create_index(self.backend, dim=EMBEDDING_DIM, **self.options)
+
+        names, embeddings, unencoded = {}, {}, []
+        for entry_id, name, embedding in db.session.query(Blacklist.id, Blacklist.name, Blacklist.embedding):
+            names[entry_id] = name
+            if embedding is None:
+                unencoded.append(entry_id)
+            elif embedding != NO_FACE:
+                embeddings[entry_id] = embedding
+
+        # Entries created before embeddings were stored get theirs computed once
+        backfilled = 0
+        for start in range(0, len(unencoded), 500):
+            for entry in Blacklist.query.filter(Blacklist.id.in_(unencoded[start:start + 500])):
+                entry.embedding = embedding_to_bytes(encode_face_image(entry.image_path))
+                backfilled += 1
+                if entry.embedding != NO_FACE:
+                    embeddings[entry.id] = entry.embedding
+        if backfilled:
+            db.session.commit()
+
+        fingerprints = {entry_id: embedding_fingerprint(data) for entry_id, data in embeddings.items()}
+        indexed = set(index.all_ids().tolist())
+        # Keep only saved vectors that still belong to the same embedding; a row id that was
+        # deleted and reused by a new entry has a different fingerprint and is re-added
+        current = {entry_id for entry_id in indexed if entry_id in fingerprints
+                   and saved.get(entry_id) == fingerprints[entry_id]}
+        stale = indexed - current
+        if stale:
+            index.remove(list(stale))
+
+        ids = sorted(fingerprints.keys() - current)
+        if ids:
+            rows = np.vstack([embedding_from_bytes(embeddings[entry_id]) for entry_id in ids])
+            if len(index):
+                index.add(ids, rows)
+            else:
+                index.build(ids, rows)
+
+        self.index, self.names, self.fingerprints = index, names, fingerprints
+        if self.path and (stale or ids or saved.keys() != fingerprints.keys()):
+            self._save()
+        print(f"Blacklist index ({self.backend}) loaded with {len(index)} entries: "
+              f"{len(ids)} added, {len(stale)} removed, {backfilled} embeddings computed.")
+
+    def _save(self):
+        self.index.save(self.path)
+        # Written after the index: if the two disagree after a crash, mismatching entries are re-added
+        pairs = np.array(sorted(self.fingerprints.items()), dtype=np.int64).reshape(-1, 2)
+        tmp = os.path.join(self.path, "fingerprints.tmp.npy")
+        np.save(tmp, pairs)
+        os.replace(tmp, os.path.join(self.path, "fingerprints.npy"))
+
+    def save(self):
+        if self.path:
+            with self.update_lock:
+                self.save_timer = None
+                self._save()
+
+    def _schedule_save(self):
+        # Called with update_lock held; one save covers every change made until it runs
+        if self.path and self.save_timer is None:
+            self.save_timer = threading.Timer(self.save_delay, self._timed_save)
+            self.save_timer.daemon = True
+            self.save_timer.start()
+
+    def _timed_save(self):
+        try:
+            self.save()
+        except Exception as e:
+            print(f"Error saving blacklist index to {self.path}: {e}")
+
+    def add(self, entry_id, name, embedding):
+        vector = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        with self.update_lock:
+            self.names[entry_id] = name
+            self.fingerprints[entry_id] = embedding_fingerprint(embedding_to_bytes(vector[0]))
+            self.index.add([entry_id], vector)
+            self._schedule_save()
+
+    def remove(self, entry_id):
+        with self.update_lock:
+            self.names.pop(entry_id, None)
+            self.fingerprints.pop(entry_id, None)
+            self.index.remove([entry_id])
+            self._schedule_save()
+
+    def match(self, encodings, threshold):
+        """
+        Return, for each live encoding, the closest entry as (entry_id, name, distance)
+        if its distance is within `threshold`, else None.
+        """
+        if len(encodings) == 0:
+            return []
+        if not len(self.index):
+            return [None] * len(encodings)
+
+        ids, distances = self.index.search(np.asarray(encodings, dtype=np.float32), k=1)
+        return [
+            (int(entry_id), self.names.get(int(entry_id)), float(d)) if entry_id >= 0 and d <= threshold else None
+            for entry_id, d in zip(ids[:, 0], distances[:, 0])
+        ]
@@ -3,6 +3,9 @@ import threading
 import logging
 import time
 
+from frame_ring import FrameRing, FrameRingReader
+from metrics import CAPTURE_FAILURES, CAPTURE_SECONDS
+
 # Configure logging
 logging.basicConfig(
     filename='camera_debug.log',
@@ -12,12 +15,34 @@ logging.basicConfig(
 )
 
 class Camera:
-    def __init__(self, ip, password):
+    def __init__(self, ip, password, threaded=False, ring_name=None, camera_id=None):
         self.ip = ip
         self.password = password
         self.cap = None
         self.lock = threading.Lock()
 
+        # Metric children are looked up once; recording a read is then two attribute updates
+        self.capture_seconds = CAPTURE_SECONDS.labels(camera_id or ip)
+        self.capture_failures = CAPTURE_FAILURES.labels(camera_id or ip)
+
+        # Latest-frame capture mode: one background thread owns cap.read() and
+        # publishes into a single slot that consumers read without blocking.
+        self.threaded = threaded
+        self.frame_condition = threading.Condition()
+        self.latest_frame = None
+        self.frame_seq = 0
+        self.frame_timestamp = None
+        self.capture_thread = None
+        self.stop_event = threading.Event()
+
+        # Optional shared-memory ring the frames are also published to, so other
+        # processes (the web process's stream encoders) can read them without decoding
+        self.ring = FrameRing(ring_name) if ring_name else None
+
+    @property
+    def connected(self):
+        return bool(self.cap is not None and self.cap.isOpened())
+
     def log_event(self, message, level="info"):
         """Log messages at the appropriate level."""
         if level == "debug":
@@ -42,33 +67,170 @@ class Camera:
         else:
             self.log_event("Failed to connect to camera. Retrying...", "warning")
 
-    def get_frame(self):
-        """Retrieve a single frame from the camera."""
+    def read_frame(self):
+        """Synchronously read and decode the next frame from the stream."""
         with self.lock:
             # Ensure the camera is connected
             if self.cap is None or not self.cap.isOpened():
                 self.log_event("Camera is not connected or stream is closed. Reconnecting...", "warning")
                 self.connect()
-            
+
             # Attempt to read a frame
-            start_time = time.time()
+            start_time = time.perf_counter()
             ret, frame = self.cap.read()
-            elapsed_time = time.time() - start_time
+            elapsed_time = time.perf_counter() - start_time
 
             if not ret:
+                self.capture_failures.inc()
                 self.log_event(f"Failed to capture frame. Elapsed time: {elapsed_time:.2f}s", "error")
                 self.cap.release()
                 self.connect()
                 return None
-            else:
-                self.log_event(f"Frame captured successfully. Elapsed time: {elapsed_time:.2f}s", "debug")
-                self.log_event(f"Frame dimensions: {frame.shape[1]}x{frame.shape[0]}", "debug")
-            
+
+            self.capture_seconds.observe(elapsed_time)
             return frame
 
+    def get_frame(self):
+        """Retrieve a single frame from the camera."""
+        if self.capture_thread is not None:
+            # Latest-frame mode: never touch the stream from the caller's thread
+            frame, _, _ = self.get_latest_frame()
+            return frame
+
+        frame = self.read_frame()
+        if frame is not None:
+            self.log_event(f"Frame captured successfully. Frame dimensions: {frame.shape[1]}x{frame.shape[0]}", "debug")
+        return frame
+
+    def start(self):
+        """Start the background capture thread if the camera runs in threaded mode."""
+        if not self.threaded or (self.capture_thread is not None and self.capture_thread.is_alive()):
+            return
+        self.stop_event.clear()
+        self.capture_thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.capture_thread.start()
+        self.log_event("Camera capture thread started.", "info")
+
+    def _capture_loop(self):
+        """Continuously grab frames so the stream buffer never holds stale data."""
+        failures = 0
+        while not self.stop_event.is_set():
+            frame = self.read_frame()
+            if frame is None:
+                failures += 1
+                # Back off while the stream is down, but stay responsive to stop()
+                self.stop_event.wait(min(2 ** failures, 30))
+                continue
+
+            failures = 0
+            self.publish_frame(frame)
+
+    def publish_frame(self, frame):
+        """Overwrite the latest-frame slot and wake up waiting consumers."""
+        with self.frame_condition:
+            self.latest_frame = frame
+            self.frame_seq += 1
+            self.frame_timestamp = time.time()
+            self.frame_condition.notify_all()
+        if self.ring is not None:
+            self.ring.write(frame, self.frame_timestamp)
+
+    def get_latest_frame(self, last_seq=None, timeout=None):
+        """
+        Return (frame, seq, timestamp) for the newest captured frame.
+
+        Without `last_seq` this never blocks. With `last_seq`, wait up to `timeout`
+        seconds for a frame newer than that sequence number; on timeout the current
+        slot is returned as-is. The frame is shared between consumers and must be
+        treated as read-only.
+        """
+        if self.capture_thread is None:
+            # Synchronous mode: read on the caller's thread and publish like the capture loop would
+            frame = self.read_frame()
+            if frame is not None:
+                self.publish_frame(frame)
+            last_seq = None
+
+        with self.frame_condition:
+            if last_seq is not None:
+                self.frame_condition.wait_for(lambda: self.frame_seq > last_seq, timeout=timeout)
+            return self.latest_frame, self.frame_seq, self.frame_timestamp
+
+    def stop(self):
+        """Stop the background capture thread."""
+        self.stop_event.set()
+        if self.capture_thread is not None:
+            self.capture_thread.join(timeout=5)
+            self.capture_thread = None
+
     def release(self):
         """Release the camera resource."""
-        if self.cap is not None:
-            self.log_event("Releasing camera resource...", "info")
-            self.cap.release()
+        self.stop()
+        with self.lock:
+            if self.cap is not None:
+                self.log_event("Releasing camera resource...", "info")
+                self.cap.release()
+        if self.ring is not None:
+            self.ring.close()
+
+
+class RingCamera:
+    """
+    Read-only camera backed by another process's frame ring (see Camera's `ring_name`).
+
+    Offers the same latest-frame interface as a threaded Camera, so stream encoders can
+    consume frames that an inference worker already captured and decoded instead of
+    opening a second RTSP connection. Each new frame is copied out of the ring once
+    (a memcpy, far cheaper than the decode it replaces), so the cached latest frame and
+    anything callers do with it can never be torn by the producer lapping the ring.
+    """
+
+    def __init__(self, ip, ring_name, poll_interval=0.01, stale_after=5.0):
+        self.ip = ip
+        self.cap = None
+        self.reader = FrameRingReader(ring_name)
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.lock = threading.Lock()
+        self.latest_frame = None
+        self.frame_seq = 0
+        self.frame_timestamp = None
+
+    @property
+    def connected(self):
+        return self.frame_timestamp is not None and time.time() - self.frame_timestamp < self.stale_after
+
+    def _poll(self):
+        with self.lock:
+            frame, seq, timestamp = self.reader.read_latest(self.frame_seq, copy=True)
+            if frame is not None:
+                self.latest_frame, self.frame_seq, self.frame_timestamp = frame, seq, timestamp
+            elif seq < self.frame_seq:
+                # The producer restarted and its sequence numbers with it
+                self.frame_seq = seq
+            return self.latest_frame, self.frame_seq, self.frame_timestamp
+
+    def get_frame(self):
+        frame, _, _ = self._poll()
+        return frame
+
+    def get_latest_frame(self, last_seq=None, timeout=None):
+        """Same contract as Camera.get_latest_frame; waits by polling the ring."""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            frame, seq, timestamp = self._poll()
+            if last_seq is None or seq != last_seq or (deadline is not None and time.time() >= deadline):
+                return frame, seq, timestamp
+            time.sleep(self.poll_interval)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def release(self):
+        with self.lock:
+            self.latest_frame = None
+            self.reader.close()
 
@@ -0,0 +1,240 @@
+import json
+import threading
+import time
+from collections import namedtuple
+
+from camera import Camera, RingCamera
+from frame_ring import ring_name
+from metrics import FRAMES_ANALYSED, QUEUE_WAIT_SECONDS
+from face_tracker import FaceTracker
+from motion_gate import MotionGate
+
+DEFAULT_CAMERA_ID = 'default'
+
+# One frame picked from a camera's latest-frame slot for the current batch.
+# motion_box is the changed region (x1, y1, x2, y2) reported by the motion gate, if any;
+# it is published with the frame's detections event.
+CameraFrame = namedtuple('CameraFrame', ['camera_id', 'frame', 'seq', 'captured_at', 'motion_box'],
+                         defaults=(None,))
+
+
+def parse_camera_settings(settings):
+    """
+    Build the list of camera definitions from the settings table.
+
+    The optional `cameras` setting holds a JSON list of {"id", "ip", "password"}
+    objects, each optionally with its own "motion_sensitivity". Without it, the single
+    `camera_ip` / `camera_password` pair is used under the id 'default', so existing
+    installations keep working unchanged.
+    """
+    raw = settings.get('cameras')
+    if raw:
+        try:
+            cameras = json.loads(raw)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid 'cameras' setting: {e}")
+        definitions = []
+        for index, entry in enumerate(cameras):
+            if not entry.get('ip'):
+                raise ValueError(f"Camera entry {index} has no 'ip'.")
+            definitions.append({
+                'id': str(entry.get('id') or f"camera{index + 1}"),
+                'ip': entry['ip'],
+                'password': entry.get('password', settings.get('camera_password', '')),
+                'motion_sensitivity': entry.get('motion_sensitivity'),
+            })
+        return definitions
+
+    return [{
+        'id': DEFAULT_CAMERA_ID,
+        'ip': settings.get('camera_ip'),
+        'password': settings.get('camera_password'),
+        'motion_sensitivity': None,
+    }]
+
+
+class CameraManager:
+    """
+    Owns every configured Camera and hands their newest frames to one shared detector.
+
+    Each camera runs its own latest-frame capture thread; the manager only reads the
+    published slots, so a slow or disconnected camera never stalls the others.
+
+    `frame_rings` shares decoded frames between processes: with 'publish' every camera
+    also writes its frames to a shared-memory ring named after `ring_prefix` and the
+    camera id; with 'consume' no stream is opened and the cameras read those rings instead.
+    """
+
+    def __init__(self, frame_skip_interval=1, scheduler=None, motion_gating=False, motion_sensitivity=0.005,
+                 tracking=False, tracker_options=None, shard=None, frame_rings=None, ring_prefix='facedet'):
+        self.cameras = {}
+        self.frame_rings = frame_rings
+        self.ring_prefix = ring_prefix
+        # (index, count): only run every count-th configured camera, for one of several worker processes
+        self.shard = shard
+        self.trackers = {}
+        self.tracking = tracking
+        self.tracker_options = tracker_options or {}
+        self.motion_gates = {}
+        self.motion_gating = motion_gating
+        self.motion_sensitivity = motion_sensitivity
+        self.definitions = {}
+        self.last_analysed_seq = {}
+        self.last_analysed_time = {}
+        self.frame_skip_interval = frame_skip_interval
+        # Optional AdaptiveScheduler; when set it replaces the fixed frame skip
+        self.scheduler = scheduler
+        self.lock = threading.Lock()
+
+    def load(self, settings):
+        """Reconcile running cameras with the settings table: start new, restart changed, release removed."""
+        definitions = {d['id']: d for d in parse_camera_settings(settings)}
+        if self.shard is not None:
+            index, count = self.shard
+            definitions = {camera_id: definitions[camera_id]
+                           for position, camera_id in enumerate(sorted(definitions)) if position % count == index}
+        with self.lock:
+            for camera_id in list(self.cameras):
+                if definitions.get(camera_id) != self.definitions.get(camera_id):
+                    self._remove(camera_id)
+            for camera_id, definition in definitions.items():
+                if camera_id not in self.cameras:
+                    self._add(definition)
+
+    def _add(self, definition):
+        name = ring_name(self.ring_prefix, definition['id']) if self.frame_rings else None
+        if self.frame_rings == 'consume':
+            camera = RingCamera(definition['ip'], name)
+        else:
+            camera = Camera(definition['ip'], definition['password'], threaded=True,
+                            ring_name=name if self.frame_rings == 'publish' else None, camera_id=definition['id'])
+        camera.start()
+        self.cameras[definition['id']] = camera
+        self.definitions[definition['id']] = definition
+        self.last_analysed_seq[definition['id']] = 0
+        self.last_analysed_time[definition['id']] = 0.0
+        if self.tracking:
+            self.trackers[definition['id']] = FaceTracker(**self.tracker_options)
+        if self.motion_gating:
+            sensitivity = definition.get('motion_sensitivity')
+            self.motion_gates[definition['id']] = MotionGate(
+                sensitivity=float(sensitivity) if sensitivity is not None else self.motion_sensitivity
+            )
+
+    def _remove(self, camera_id):
+        camera = self.cameras.pop(camera_id)
+        self.definitions.pop(camera_id, None)
+        self.last_analysed_seq.pop(camera_id, None)
+        self.last_analysed_time.pop(camera_id, None)
+        self.motion_gates.pop(camera_id, None)
+        self.trackers.pop(camera_id, None)
+        # Releasing may wait on a blocked RTSP read; don't hold up the caller
+        threading.Thread(target=camera.release, daemon=True).start()
+
+    def get(self, camera_id=None):
+        """Return the camera with the given id, or the first configured camera."""
+        with self.lock:
+            if camera_id is None:
+                return next(iter(self.cameras.values()), None)
+            return self.cameras.get(camera_id)
+
+    def camera_ids(self):
+        with self.lock:
+            return list(self.cameras)
+
+    def status(self):
+        """Connection state of every camera, keyed by camera id."""
+        with self.lock:
+            return {
+                camera_id: {
+                    'ip': camera.ip,
+                    'connected': camera.connected,
+                    'frame_seq': camera.frame_seq,
+                    'motion': self.motion_gates[camera_id].stats() if camera_id in self.motion_gates else None,
+                }
+                for camera_id, camera in self.cameras.items()
+            }
+
+    def is_due(self, camera_id, seq, captured_at):
+        """Whether a camera's newest frame should be analysed now."""
+        if seq <= self.last_analysed_seq[camera_id]:
+            return False
+        if self.scheduler is not None:
+            interval = self.scheduler.interval_for(camera_id)
+            return captured_at - self.last_analysed_time[camera_id] >= interval
+        return seq - self.last_analysed_seq[camera_id] >= self.frame_skip_interval
+
+    def collect_frames(self):
+        """
+        Take the newest frame from every camera that is due for analysis, either by
+        the scheduler's interval or by the fixed `frame_skip_interval`, and that the
+        camera's motion gate lets through. Never blocks.
+        """
+        batch = []
+        with self.lock:
+            for camera_id, camera in self.cameras.items():
+                frame, seq, captured_at = camera.get_latest_frame()
+                if frame is None or not self.is_due(camera_id, seq, captured_at):
+                    continue
+                # A static frame counts as analysed so the gate runs at the scheduled rate only
+                self.last_analysed_seq[camera_id] = seq
+                self.last_analysed_time[camera_id] = captured_at
+
+                motion_box = None
+                gate = self.motion_gates.get(camera_id)
+                if gate is not None:
+                    changed, motion_box = gate.check(frame, captured_at)
+                    if not changed:
+                        continue
+                QUEUE_WAIT_SECONDS.labels(camera_id).observe(time.time() - captured_at)
+                FRAMES_ANALYSED.labels(camera_id).inc()
+                batch.append(CameraFrame(camera_id, frame, seq, captured_at, motion_box))
+        return batch
+
+    def next_batch(self, poll_interval=0.01, timeout=None):
+        """Wait until at least one camera has a frame due for analysis and return the batch."""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            batch = self.collect_frames()
+            if batch or (deadline is not None and time.time() >= deadline):
+                return batch
+            time.sleep(poll_interval)
+
+    def detect(self, detector, batch):
+        """Run one batched forward pass over frames from several cameras."""
+        start_time = time.time()
+        results = detector.detect_faces_batch([item.frame for item in batch])
+        end_time = time.time()
+        results = [(item, boxes, scores) for item, (boxes, scores) in zip(batch, results)]
+
+        if self.scheduler is not None:
+            self.scheduler.record(
+                end_time - start_time,
+                [(item.camera_id, bool(boxes), end_time - item.captured_at) for item, boxes, _ in results],
+                now=end_time,
+            )
+        return results
+
+    def track(self, item, boxes, scores):
+        """
+        Feed one frame's detections to its camera's tracker.
+
+        Returns the tracker events, or None when tracking is disabled.
+        """
+        tracker = self.trackers.get(item.camera_id)
+        if tracker is None:
+            return None
+        return tracker.update(boxes, scores, item.captured_at)
+
+    def close_rings(self):
+        """Stop capturing and unlink every published frame ring, for a process about to exit."""
+        with self.lock:
+            for camera in self.cameras.values():
+                if getattr(camera, 'ring', None) is not None:
+                    camera.stop()
+                    camera.ring.close()
+
+    def release_all(self):
+        with self.lock:
+            for camera_id in list(self.cameras):
+                self._remove(camera_id)
@@ -2,7 +2,19 @@
 
 import os
 
+from sqlalchemy.pool import QueuePool
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your-secret-key'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///face_recognition.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Sized for the camera, snapshot writer, retention and stream threads plus Flask request threads
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        # Explicit: SQLAlchemy 1.4 defaults file SQLite to NullPool, which rejects the sizing options
+        'poolclass': QueuePool,
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 16)),
+        'max_overflow': 8,
+        'pool_timeout': 10,
+        'pool_pre_ping': False,  # Local file database: connections do not go stale
+        'connect_args': {'timeout': 5, 'check_same_thread': False},
+    }
@@ -0,0 +1,339 @@
+import datetime
+import json
+import os
+import smtplib
+import threading
+import time
+from collections import OrderedDict
+from email.mime.image import MIMEImage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import cv2
+
+from models_tools import db, EmailOutbox as OutboxMessage
+from sqlite_tuning import serialized_write
+
+
+def smtp_config(settings):
+    """
+    SMTP connection settings from the settings table, or None if no server is configured.
+    Login is skipped without a username and STARTTLS with smtp_starttls=false, so a local
+    stand-in server (e.g. `python -m aiosmtpd -n -l localhost:1025`) works for testing.
+    """
+    if not settings.get('smtp_server') or not settings.get('smtp_port'):
+        return None
+    return {
+        'server': settings['smtp_server'],
+        'port': int(settings['smtp_port']),
+        'username': settings.get('smtp_username') or None,
+        'password': settings.get('smtp_password') or None,
+        'starttls': str(settings.get('smtp_starttls', 'true')).lower() not in ('false', '0', 'no'),
+        'sender': settings.get('smtp_sender') or settings.get('smtp_username') or 'facedetection@localhost',
+    }
+
+
+def downscale_jpeg(path, max_width, quality):
+    """JPEG bytes of the image at `path`, at most `max_width` pixels wide, or None if it cannot be read."""
+    frame = cv2.imread(path)
+    if frame is None:
+        return None
+    height, width = frame.shape[:2]
+    if width > max_width:
+        frame = cv2.resize(frame, (max_width, int(round(height * max_width / width))), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes() if ok else None
+
+
+class SMTPSession:
+    """One authenticated SMTP connection reused across messages, reopened if it drops or the settings change."""
+
+    def __init__(self, idle_timeout=60, timeout=30):
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.connection = None
+        self.config = None
+        self.last_used = 0.0
+        self.connects = 0
+
+    def send(self, config, message):
+        for attempt in range(2):
+            self._connect(config)
+            try:
+                self.connection.send_message(message)
+                self.last_used = time.time()
+                return
+            except smtplib.SMTPServerDisconnected:
+                # The server closed an idle connection: reconnect once and retry
+                self.close()
+                if attempt:
+                    raise
+
+    def _connect(self, config):
+        if self.connection is not None and config == self.config:
+            return
+        self.close()
+        connection = smtplib.SMTP(config['server'], config['port'], timeout=self.timeout)
+        try:
+            if config['starttls']:
+                connection.starttls()
+            if config['username'] and config['password']:
+                connection.login(config['username'], config['password'])
+        except Exception:
+            connection.close()
+            raise
+        self.connection, self.config = connection, config
+        self.connects += 1
+
+    def close_if_idle(self):
+        if self.connection is not None and time.time() - self.last_used > self.idle_timeout:
+            self.close()
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except Exception:
+                self.connection.close()
+            self.connection = None
+
+
+class EmailOutbox:
+    """
+    Persistent email queue drained by one background worker over a reused SMTP connection.
+
+    enqueue() only inserts an email_outbox row, so callers never wait on SMTP, and queued
+    mail survives restarts. Rows with a `digest_key` are held for `digest_window` seconds;
+    when the first one is due, every pending row with the same recipient and key goes out
+    as one digest. Image attachments are downscaled to `attachment_max_width` before
+    sending. Failed sends are retried with exponential backoff up to `max_attempts`.
+    Relative attachment paths are resolved against the app root, like the routes that
+    serve and queue them; an image that cannot be read is logged, counted and named in
+    the email body rather than silently left out.
+
+    Sent rows are deleted once they are older than `sent_retention` seconds. The pending
+    and failed totals shown by stats() are kept in memory; they are loaded from the table
+    once and resynchronised every `maintenance_interval` seconds, which also picks up
+    mail queued by other processes.
+
+    `settings` is a callable returning the current settings dict (SMTP server and login).
+    """
+
+    def __init__(self, app, settings, digest_window=60, batch_size=50, poll_interval=5, idle_timeout=60,
+                 max_attempts=5, retry_delay=30, attachment_max_width=1280, attachment_quality=80,
+                 max_digest_attachments=10, sent_retention=7 * 24 * 3600, maintenance_interval=600,
+                 purge_chunk_size=500):
+        self.app = app
+        self.settings = settings
+        self.digest_window = digest_window
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.attachment_max_width = attachment_max_width
+        self.attachment_quality = attachment_quality
+        self.max_digest_attachments = max_digest_attachments
+        self.sent_retention = sent_retention
+        self.maintenance_interval = maintenance_interval
+        self.purge_chunk_size = purge_chunk_size
+
+        self.session = SMTPSession(idle_timeout=idle_timeout)
+        self.wake_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.counters = {'queued': 0, 'sent_messages': 0, 'sent_emails': 0, 'failed': 0, 'retries': 0,
+                         'missing_attachments': 0, 'purged': 0}
+        self.last_error = None
+        self.status_counts = None  # {'pending': n, 'failed': n}, loaded on first use
+        self.counts_lock = threading.Lock()
+        self.last_maintenance = 0.0
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=10):
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+            self.thread = None
+
+    def enqueue(self, recipient, subject, body, attachments=(), digest_key=None):
+        """Queue an email and return its outbox id. Attachments are image paths."""
+        now = datetime.datetime.utcnow()
+        not_before = now + datetime.timedelta(seconds=self.digest_window) if digest_key else now
+        with self.app.app_context(), serialized_write():
+            message = OutboxMessage(recipient=recipient, subject=subject, body=body,
+                                    attachments=json.dumps(list(attachments)), digest_key=digest_key,
+                                    created_at=now, not_before=not_before)
+            db.session.add(message)
+            db.session.commit()
+            message_id = message.id
+        self.counters['queued'] += 1
+        self._count('pending', 1)
+        if not digest_key:
+            self.wake_event.set()
+        return message_id
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                if time.time() - self.last_maintenance >= self.maintenance_interval:
+                    self.maintain()
+                self.drain()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error in email outbox: {e}")
+            self.session.close_if_idle()
+            self.wake_event.wait(self.poll_interval)
+            self.wake_event.clear()
+        self.session.close()
+
+    def drain(self):
+        """Send every due message (and its digest group) now. Returns the number of emails sent."""
+        config = smtp_config(self.settings())
+        if config is None:
+            return 0
+        sent = 0
+        with self.app.app_context():
+            now = datetime.datetime.utcnow()
+            due = OutboxMessage.query.filter(
+                OutboxMessage.status == 'pending', OutboxMessage.not_before <= now
+            ).order_by(OutboxMessage.id).limit(self.batch_size).all()
+
+            groups = OrderedDict()
+            for message in due:
+                key = (message.recipient, message.digest_key or f"#{message.id}")
+                if key in groups:
+                    continue
+                if message.digest_key:
+                    # Pull in the rest of the window, even rows that are not due yet
+                    groups[key] = OutboxMessage.query.filter_by(
+                        status='pending', recipient=message.recipient, digest_key=message.digest_key
+                    ).order_by(OutboxMessage.id).all()
+                else:
+                    groups[key] = [message]
+
+            for messages in groups.values():
+                try:
+                    self.session.send(config, self._build(config, messages))
+                except Exception as e:
+                    self._failed(messages, e)
+                    if isinstance(e, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError)):
+                        break  # The server is unreachable; leave the rest for the next poll
+                    continue
+                with serialized_write():
+                    sent_at = datetime.datetime.utcnow()
+                    for message in messages:
+                        message.status, message.sent_at = 'sent', sent_at
+                    db.session.commit()
+                sent += 1
+                self.counters['sent_emails'] += 1
+                self.counters['sent_messages'] += len(messages)
+                self._count('pending', -len(messages))
+        return sent
+
+    def _failed(self, messages, error):
+        self.last_error = str(error)
+        print(f"Error sending email to {messages[0].recipient}: {error}")
+        with serialized_write():
+            for message in messages:
+                message.attempts += 1
+                message.last_error = str(error)
+                if message.attempts >= self.max_attempts:
+                    message.status = 'failed'
+                    self.counters['failed'] += 1
+                    self._count('pending', -1)
+                    self._count('failed', 1)
+                else:
+                    delay = self.retry_delay * 2 ** (message.attempts - 1)
+                    message.not_before = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+                    self.counters['retries'] += 1
+            db.session.commit()
+
+    def _build(self, config, messages):
+        first = messages[0]
+        msg = MIMEMultipart()
+        msg['From'] = config['sender']
+        msg['To'] = first.recipient
+        if len(messages) == 1:
+            msg['Subject'] = first.subject
+            body = first.body
+        else:
+            msg['Subject'] = f"{first.subject} ({len(messages)} alerts)"
+            body = "\n\n".join(f"[{m.created_at:%Y-%m-%d %H:%M:%S} UTC] {m.body}" for m in messages)
+
+        paths = list(OrderedDict.fromkeys(path for m in messages for path in json.loads(m.attachments)))
+        omitted = max(0, len(paths) - self.max_digest_attachments)
+
+        images, missing = [], []
+        for path in paths[:self.max_digest_attachments]:
+            data = downscale_jpeg(self.resolve_path(path), self.attachment_max_width, self.attachment_quality)
+            if data is None:
+                missing.append(path)
+                continue
+            image = MIMEImage(data, _subtype='jpeg')
+            image.add_header('Content-Disposition', 'attachment', filename=os.path.basename(path))
+            images.append(image)
+        if missing:
+            self.counters['missing_attachments'] += len(missing)
+            print(f"Email to {first.recipient}: could not read attachment(s) {', '.join(missing)}")
+            body += "\n\nCould not attach (image no longer available): " + ", ".join(
+                os.path.basename(path) for path in missing)
+        if omitted:
+            body += f"\n\n{omitted} more image(s) not attached."
+
+        msg.attach(MIMEText(body, 'plain'))
+        for image in images:
+            msg.attach(image)
+        return msg
+
+    def resolve_path(self, path):
+        """Attachment paths are stored relative to the app root, as served under /static."""
+        return path if os.path.isabs(path) else os.path.join(self.app.root_path, path)
+
+    def _count(self, status, delta):
+        with self.counts_lock:
+            if self.status_counts is not None:
+                self.status_counts[status] = max(0, self.status_counts[status] + delta)
+
+    def _load_counts(self):
+        with self.app.app_context():
+            by_status = dict(db.session.query(OutboxMessage.status, db.func.count(OutboxMessage.id))
+                             .filter(OutboxMessage.status != 'sent')
+                             .group_by(OutboxMessage.status).all())
+        counts = {'pending': by_status.get('pending', 0), 'failed': by_status.get('failed', 0)}
+        with self.counts_lock:
+            self.status_counts = counts
+        return counts
+
+    def maintain(self):
+        """Delete sent rows past the retention window and resynchronise the status totals."""
+        self.last_maintenance = time.time()
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.sent_retention)
+        with self.app.app_context():
+            while not self.stop_event.is_set():
+                with serialized_write():
+                    ids = [row_id for (row_id,) in db.session.query(OutboxMessage.id).filter(
+                        OutboxMessage.status == 'sent', OutboxMessage.sent_at < cutoff
+                    ).limit(self.purge_chunk_size).all()]
+                    if ids:
+                        OutboxMessage.query.filter(OutboxMessage.id.in_(ids)).delete(synchronize_session=False)
+                        db.session.commit()
+                self.counters['purged'] += len(ids)
+                if len(ids) < self.purge_chunk_size:
+                    break
+        self._load_counts()
+
+    def stats(self):
+        with self.counts_lock:
+            counts = self.status_counts
+        if counts is None:
+            counts = self._load_counts()
+        return dict(self.counters, pending=counts['pending'], failed_total=counts['failed'],
+                    smtp_connects=self.session.connects, connected=self.session.connection is not None,
+                    last_error=self.last_error)
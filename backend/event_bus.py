@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import deque
+
+
+class EventBus:
+    """
+    Minimal in-process publish/subscribe. Handlers run synchronously on the publishing
+    thread, so they must only hand the event off (e.g. into a buffer), never block.
+    """
+
+    def __init__(self):
+        self.handlers = {}
+        self.lock = threading.Lock()
+        self.published = {}
+
+    def subscribe(self, topic, handler):
+        with self.lock:
+            self.handlers.setdefault(topic, []).append(handler)
+
+    def publish(self, topic, payload):
+        with self.lock:
+            handlers = list(self.handlers.get(topic, ()))
+            self.published[topic] = self.published.get(topic, 0) + 1
+        for handler in handlers:
+            try:
+                handler(topic, payload)
+            except Exception as e:
+                print(f"Error in event bus handler for {topic}: {e}")
+
+
+# Topics forwarded to SocketIO clients and how pending events of each coalesce
+LIVE_TOPICS = ('snapshots', 'detections', 'dashboard_stats')
+DEFAULT_LIVE_TOPICS = ('snapshots', 'dashboard_stats')
+
+
+class _LiveClient:
+    """Subscription and pending, not-yet-delivered events of one socket."""
+
+    def __init__(self, max_snapshots):
+        self.topics = set(DEFAULT_LIVE_TOPICS)
+        self.cameras = None  # None: every camera
+        self.snapshots = deque(maxlen=max_snapshots)
+        self.dropped_snapshots = 0
+        self.detections = {}  # camera_id -> latest detections
+        self.dashboard_stats = None
+        self.in_flight_since = None
+
+    def wants(self, topic, camera_id):
+        return topic in self.topics and (camera_id is None or self.cameras is None or camera_id in self.cameras)
+
+    def add(self, topic, payload):
+        if topic == 'snapshots':
+            if len(self.snapshots) == self.snapshots.maxlen:
+                self.dropped_snapshots += 1
+            self.snapshots.append(payload)
+        elif topic == 'detections':
+            self.detections[payload.get('camera_id')] = payload
+        else:
+            self.dashboard_stats = payload
+
+    def has_pending(self):
+        return bool(self.snapshots or self.detections or self.dashboard_stats is not None or self.dropped_snapshots)
+
+    def take_bundle(self):
+        bundle = {}
+        if self.snapshots or self.dropped_snapshots:
+            bundle['snapshots'] = list(self.snapshots)
+            bundle['dropped_snapshots'] = self.dropped_snapshots
+        if self.detections:
+            bundle['detections'] = list(self.detections.values())
+        if self.dashboard_stats is not None:
+            bundle['dashboard_stats'] = self.dashboard_stats
+        self.snapshots.clear()
+        self.dropped_snapshots = 0
+        self.detections = {}
+        self.dashboard_stats = None
+        return bundle
+
+
+class SocketIOForwarder:
+    """
+    Forwards bus events to SocketIO clients as coalesced 'live_update' bundles.
+
+    Each socket subscribes to topics and, optionally, to a set of cameras. Events are
+    buffered per socket and flushed at most every `flush_interval` seconds as one bundle:
+    new snapshots are listed (the newest `max_snapshots`, with a count of any dropped),
+    detections and dashboard stats keep only the latest value per camera.
+
+    Backpressure: a socket has at most one bundle in flight. The next one is only sent
+    after the client acknowledges the previous one (or `ack_timeout` passes), so a slow
+    socket receives fewer, larger bundles instead of growing an unbounded queue.
+    """
+
+    def __init__(self, socketio, bus, flush_interval=0.25, max_snapshots=50, ack_timeout=10.0):
+        self.socketio = socketio
+        self.flush_interval = flush_interval
+        self.max_snapshots = max_snapshots
+        self.ack_timeout = ack_timeout
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.pending_event = threading.Event()
+        self.thread = None
+        self.counters = {'bundles': 0, 'acks': 0, 'ack_timeouts': 0, 'dropped_snapshots': 0}
+        for topic in LIVE_TOPICS:
+            bus.subscribe(topic, self._on_event)
+
+    def connect(self, sid):
+        with self.lock:
+            self.clients[sid] = _LiveClient(self.max_snapshots)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def disconnect(self, sid):
+        with self.lock:
+            self.clients.pop(sid, None)
+
+    def subscribe(self, sid, topics=None, cameras=None):
+        """Replace a socket's subscription. topics=None keeps the defaults, cameras=None means every camera."""
+        with self.lock:
+            client = self.clients.get(sid)
+            if client is None:
+                return
+            client.topics = set(DEFAULT_LIVE_TOPICS if topics is None else topics) & set(LIVE_TOPICS)
+            client.cameras = set(cameras) if cameras else None
+
+    def _on_event(self, topic, payload):
+        camera_id = payload.get('camera_id') if isinstance(payload, dict) else None
+        with self.lock:
+            for client in self.clients.values():
+                if client.wants(topic, camera_id):
+                    client.add(topic, payload)
+        self.pending_event.set()
+
+    def _acked(self, sid, *args):
+        with self.lock:
+            client = self.clients.get(sid)
+            if client is not None:
+                client.in_flight_since = None
+            self.counters['acks'] += 1
+        # Anything that accumulated while waiting for the ack can go now
+        self.pending_event.set()
+
+    def _run(self):
+        while True:
+            self.pending_event.wait(self.ack_timeout)
+            self.pending_event.clear()
+            with self.lock:
+                if not self.clients:
+                    self.thread = None
+                    return
+                now = time.time()
+                outgoing = []
+                for sid, client in self.clients.items():
+                    if client.in_flight_since is not None:
+                        if now - client.in_flight_since < self.ack_timeout:
+                            continue
+                        self.counters['ack_timeouts'] += 1
+                    if client.has_pending():
+                        self.counters['dropped_snapshots'] += client.dropped_snapshots
+                        client.in_flight_since = now
+                        outgoing.append((sid, client.take_bundle()))
+            for sid, bundle in outgoing:
+                try:
+                    self.socketio.emit('live_update', bundle, to=sid,
+                                       callback=lambda *args, sid=sid: self._acked(sid, *args))
+                    self.counters['bundles'] += 1
+                except Exception as e:
+                    print(f"Error emitting live update to {sid}: {e}")
+            # Coalescing window: events arriving during the sleep go out in the next bundle
+            time.sleep(self.flush_interval)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, clients=len(self.clients),
+                        in_flight=sum(1 for c in self.clients.values() if c.in_flight_since is not None))
@@ -0,0 +1,337 @@
+"""
+Pluggable nearest-neighbour indexes for face embeddings.
+
+ExactIndex scans every stored embedding with one matrix product per query batch.
+IVFIndex partitions embeddings into `nlist` k-means cells and only scans the
+`nprobe` cells closest to each query; it persists to a directory of .npy files
+that are memory-mapped on load, so opening a large watchlist costs no RAM up front.
+
+Both backends share the same interface: build / add / remove / search / save / load.
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+
+
+def pairwise_distances(encodings, matrix, sq_norms=None):
+    """Euclidean distances between [M, D] encodings and the [N, D] matrix rows: [M, N]."""
+    queries = np.asarray(encodings, dtype=np.float32).reshape(-1, matrix.shape[1])
+    if sq_norms is None:
+        sq_norms = np.einsum('ij,ij->i', matrix, matrix)
+    # |q - m|^2 = |q|^2 + |m|^2 - 2 q.m, one matrix product for all pairs
+    sq = np.einsum('ij,ij->i', queries, queries)[:, None] + sq_norms[None, :] - 2.0 * queries @ matrix.T
+    return np.sqrt(np.maximum(sq, 0.0))
+
+
+def top_k(distances, ids, k):
+    """Smallest `k` distances per row, padded with id -1 / distance inf."""
+    m, n = distances.shape
+    out_ids = np.full((m, k), -1, dtype=np.int64)
+    out_dist = np.full((m, k), np.inf, dtype=np.float32)
+    if n == 0:
+        return out_ids, out_dist
+    kk = min(k, n)
+    part = np.argpartition(distances, kk - 1, axis=1)[:, :kk]
+    part_dist = np.take_along_axis(distances, part, axis=1)
+    order = np.argsort(part_dist, axis=1)
+    out_ids[:, :kk] = ids[np.take_along_axis(part, order, axis=1)]
+    out_dist[:, :kk] = np.take_along_axis(part_dist, order, axis=1)
+    return out_ids, out_dist
+
+
+def _save_arrays(path, arrays, meta):
+    """Write arrays and metadata, replacing each file atomically."""
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        tmp = os.path.join(path, f"{name}.tmp.npy")
+        np.save(tmp, array)
+        os.replace(tmp, os.path.join(path, f"{name}.npy"))
+    tmp = os.path.join(path, "meta.json.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, "meta.json"))
+
+
+class ExactIndex:
+    """Brute-force index: exact results, cost linear in the number of identities."""
+
+    kind = 'exact'
+
+    def __init__(self, dim=128):
+        self.dim = dim
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.sq_norms = np.empty(0, dtype=np.float32)
+        self.lock = threading.Lock()  # Guards the swap of the published arrays
+        self.update_lock = threading.Lock()  # Serializes read-modify-write updates
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _swap(self, ids, vectors):
+        sq_norms = np.einsum('ij,ij->i', vectors, vectors)
+        with self.lock:
+            self.ids, self.vectors, self.sq_norms = ids, vectors, sq_norms
+
+    def build(self, ids, vectors):
+        with self.update_lock:
+            self._swap(np.asarray(ids, dtype=np.int64),
+                       np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+
+    def add(self, ids, vectors):
+        with self.update_lock:
+            self._swap(np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)]),
+                       np.vstack([self.vectors, np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)]))
+
+    def remove(self, ids):
+        with self.update_lock:
+            keep = ~np.isin(self.ids, ids)
+            if not keep.all():
+                self._swap(self.ids[keep], self.vectors[keep])
+
+    def all_ids(self):
+        with self.lock:
+            return self.ids
+
+    def search(self, queries, k=1):
+        """Return ([M, k] ids, [M, k] distances) of the nearest stored embeddings."""
+        with self.lock:
+            ids, vectors, sq_norms = self.ids, self.vectors, self.sq_norms
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        return top_k(pairwise_distances(queries, vectors, sq_norms), ids, k)
+
+    def save(self, path):
+        with self.lock:
+            ids, vectors = self.ids, self.vectors
+        _save_arrays(path, {'ids': ids, 'vectors': vectors}, {'kind': self.kind, 'dim': self.dim})
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        mode = 'r' if mmap else None
+        index = cls(dim=meta['dim'])
+        index._swap(np.load(os.path.join(path, "ids.npy"), mmap_mode=mode),
+                    np.load(os.path.join(path, "vectors.npy"), mmap_mode=mode))
+        return index
+
+
+def nearest_centroid(vectors, centroids, chunk=4096):
+    """Index of the closest centroid for every vector, in chunks to bound memory."""
+    sq_norms = np.einsum('ij,ij->i', centroids, centroids)
+    return np.concatenate([
+        pairwise_distances(vectors[i:i + chunk], centroids, sq_norms).argmin(axis=1)
+        for i in range(0, len(vectors), chunk)
+    ]) if len(vectors) else np.empty(0, dtype=np.int64)
+
+
+def kmeans(vectors, k, iterations=10, sample=20000, seed=0):
+    """Plain Lloyd's k-means on a random sample; returns [k, D] centroids."""
+    rng = np.random.default_rng(seed)
+    if len(vectors) > sample:
+        vectors = vectors[rng.choice(len(vectors), sample, replace=False)]
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = nearest_centroid(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        counts = np.bincount(assign, minlength=k)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty cells
+        empty = np.flatnonzero(~filled)
+        centroids[empty] = vectors[rng.integers(len(vectors), size=len(empty))]
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file index: embeddings are grouped by their nearest k-means centroid and
+    stored contiguously per cell, so a query only scans `nprobe` of `nlist` cells.
+
+    Additions go to a small in-memory delta that is searched exactly and merged into
+    the cells once it grows past `merge_threshold`; removals are tombstones until the
+    next merge or save. A merge keeps the centroids unless the index has outgrown them
+    (fewer than half the cells its size calls for), in which case it retrains, so an
+    index grown one entry at a time does not collapse into a few huge cells.
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, dim=128, nlist=None, nprobe=8, merge_threshold=1024):
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.merge_threshold = merge_threshold
+
+        self.centroids = np.empty((0, dim), dtype=np.float32)
+        self.offsets = np.zeros(1, dtype=np.int64)  # Cell c occupies rows offsets[c]:offsets[c + 1]
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.sq_norms = np.empty(0, dtype=np.float32)
+        self.delta_ids = np.empty(0, dtype=np.int64)
+        self.delta_vectors = np.empty((0, dim), dtype=np.float32)
+        self.tombstones = np.empty(0, dtype=np.int64)
+        self.lock = threading.Lock()
+        self.update_lock = threading.Lock()
+
+    def __len__(self):
+        with self.lock:
+            return len(self.ids) + len(self.delta_ids) - len(self.tombstones)
+
+    def build(self, ids, vectors):
+        """Train centroids on `vectors` and lay all embeddings out by cell."""
+        with self.update_lock:
+            self._build(np.asarray(ids, dtype=np.int64),
+                        np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim))
+
+    def _target_nlist(self, count):
+        nlist = self.nlist or max(1, int(4 * np.sqrt(count)))
+        return min(nlist, max(1, count))
+
+    def _build(self, ids, vectors):
+        nlist = self._target_nlist(len(ids))
+        centroids = kmeans(vectors, nlist) if len(ids) else np.empty((0, self.dim), dtype=np.float32)
+        self._layout(centroids, ids, vectors)
+
+    def _layout(self, centroids, ids, vectors):
+        """Sort embeddings by nearest centroid and publish the new cell arrays."""
+        if len(ids) and len(centroids):
+            assign = nearest_centroid(vectors, centroids)
+        else:
+            assign = np.empty(0, dtype=np.int64)
+        order = np.argsort(assign, kind='stable')
+        counts = np.bincount(assign, minlength=len(centroids))
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        ids, vectors = ids[order], np.ascontiguousarray(vectors[order])
+        sq_norms = np.einsum('ij,ij->i', vectors, vectors)
+        with self.lock:
+            self.centroids, self.offsets = centroids.astype(np.float32), offsets
+            self.ids, self.vectors, self.sq_norms = ids, vectors, sq_norms
+            self.delta_ids = np.empty(0, dtype=np.int64)
+            self.delta_vectors = np.empty((0, self.dim), dtype=np.float32)
+            self.tombstones = np.empty(0, dtype=np.int64)
+
+    def _merge(self):
+        """Fold the delta and tombstones into the cells, retraining if the cells are outgrown."""
+        ids, vectors = self._merged_arrays()
+        if len(self.centroids) * 2 <= self._target_nlist(len(ids)):
+            self._build(ids, vectors)
+        else:
+            self._layout(self.centroids, ids, vectors)
+
+    def _merged_arrays(self):
+        """All live embeddings: cells plus delta, minus tombstones."""
+        ids = np.concatenate([self.ids, self.delta_ids])
+        vectors = np.vstack([np.asarray(self.vectors), self.delta_vectors])
+        keep = ~np.isin(ids, self.tombstones)
+        return ids[keep], vectors[keep]
+
+    def add(self, ids, vectors):
+        with self.update_lock:
+            ids = np.asarray(ids, dtype=np.int64)
+            vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+            if not len(self.centroids):
+                # Nothing trained yet: the first additions become the initial build
+                self._build(ids, vectors)
+                return
+            if np.isin(ids, self.tombstones).any():
+                # A removed id is coming back: drop its old embedding physically first
+                self._merge()
+            with self.lock:
+                self.delta_ids = np.concatenate([self.delta_ids, ids])
+                self.delta_vectors = np.vstack([self.delta_vectors, vectors])
+            if len(self.delta_ids) >= self.merge_threshold:
+                self._merge()
+
+    def remove(self, ids):
+        with self.update_lock:
+            ids = np.asarray(ids, dtype=np.int64)
+            ids = ids[np.isin(ids, self.ids) | np.isin(ids, self.delta_ids)]
+            with self.lock:
+                self.tombstones = np.union1d(self.tombstones, ids)
+
+    def all_ids(self):
+        with self.lock:
+            ids = np.concatenate([self.ids, self.delta_ids])
+            return ids[~np.isin(ids, self.tombstones)]
+
+    def search(self, queries, k=1, nprobe=None):
+        """Return ([M, k] ids, [M, k] distances) of the approximate nearest embeddings."""
+        nprobe = nprobe or self.nprobe
+        with self.lock:
+            centroids, offsets = self.centroids, self.offsets
+            ids, vectors, sq_norms = self.ids, self.vectors, self.sq_norms
+            delta_ids, delta_vectors, tombstones = self.delta_ids, self.delta_vectors, self.tombstones
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+
+        out_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        out_dist = np.full((len(queries), k), np.inf, dtype=np.float32)
+        if len(centroids):
+            probes = np.argsort(pairwise_distances(queries, centroids), axis=1)[:, :nprobe]
+        for qi, query in enumerate(queries):
+            rows = [np.arange(offsets[c], offsets[c + 1]) for c in probes[qi]] if len(centroids) else []
+            rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+            cand_ids = np.concatenate([ids[rows], delta_ids])
+            cand_vectors = np.vstack([vectors[rows], delta_vectors])
+            cand_norms = np.concatenate([sq_norms[rows], np.einsum('ij,ij->i', delta_vectors, delta_vectors)])
+            if len(tombstones):
+                keep = ~np.isin(cand_ids, tombstones)
+                cand_ids, cand_vectors, cand_norms = cand_ids[keep], cand_vectors[keep], cand_norms[keep]
+            if not len(cand_ids):
+                continue
+            q_ids, q_dist = top_k(pairwise_distances(query[None], cand_vectors, cand_norms), cand_ids, k)
+            out_ids[qi], out_dist[qi] = q_ids[0], q_dist[0]
+        return out_ids, out_dist
+
+    def save(self, path):
+        """Merge pending changes and write the cell layout for memory-mapped loading."""
+        with self.update_lock:
+            if len(self.delta_ids) or len(self.tombstones):
+                self._merge()
+            with self.lock:
+                arrays = {'centroids': self.centroids, 'offsets': self.offsets, 'ids': self.ids,
+                          'vectors': np.asarray(self.vectors), 'sq_norms': self.sq_norms}
+            meta = {'kind': self.kind, 'dim': self.dim, 'nlist': self.nlist, 'nprobe': self.nprobe,
+                    'merge_threshold': self.merge_threshold}
+            _save_arrays(path, arrays, meta)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        index = cls(dim=meta['dim'], nlist=meta['nlist'], nprobe=meta['nprobe'],
+                    merge_threshold=meta['merge_threshold'])
+        mode = 'r' if mmap else None
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode=mode)
+        with index.lock:
+            index.centroids = np.load(os.path.join(path, "centroids.npy"))
+            index.offsets = np.load(os.path.join(path, "offsets.npy"))
+            index.ids = np.load(os.path.join(path, "ids.npy"))
+            index.vectors = vectors
+            index.sq_norms = np.load(os.path.join(path, "sq_norms.npy"), mmap_mode=mode)
+        return index
+
+
+INDEX_BACKENDS = {
+    ExactIndex.kind: ExactIndex,
+    IVFIndex.kind: IVFIndex,
+}
+
+
+def create_index(kind='exact', **options):
+    """Instantiate an index backend by name."""
+    try:
+        return INDEX_BACKENDS[kind](**options)
+    except KeyError:
+        raise ValueError(f"Unknown face index backend: {kind}")
+
+
+def load_index(path, mmap=True):
+    """Open a saved index of whichever backend wrote it."""
+    with open(os.path.join(path, "meta.json")) as f:
+        kind = json.load(f)['kind']
+    return INDEX_BACKENDS[kind].load(path, mmap=mmap)
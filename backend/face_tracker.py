@@ -0,0 +1,125 @@
+import itertools
+
+import numpy as np
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU between two [N, 4] and [M, 4] arrays of xyxy boxes."""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+def box_quality(box, score):
+    """Snapshot quality of a detection: confident and large faces are preferred."""
+    x1, y1, x2, y2 = box
+    return score * np.sqrt(max(x2 - x1, 0) * max(y2 - y1, 0))
+
+
+class Track:
+    def __init__(self, track_id, box, score, now):
+        self.track_id = track_id
+        self.box = np.asarray(box, dtype=np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)  # xyxy change per second
+        self.score = score
+        self.hits = 1
+        self.misses = 0  # Analysed frames since the last matching detection
+        self.first_seen = now
+        self.last_seen = now
+        self.best_quality = box_quality(box, score)
+        self.snapshot = None  # Set by the caller once the entry snapshot is stored
+        self.blacklist_match = None  # (entry_id, name, distance) once matched
+
+    def predict(self, now, horizon=1.0):
+        """Constant-velocity estimate of where the box is at `now`, extrapolating at most `horizon` seconds."""
+        return self.box + self.velocity * min(now - self.last_seen, horizon)
+
+    def update(self, box, score, now, smoothing=0.5):
+        box = np.asarray(box, dtype=np.float32)
+        dt = now - self.last_seen
+        if dt > 0:
+            self.velocity = (1 - smoothing) * self.velocity + smoothing * (box - self.box) / dt
+        self.box = box
+        self.score = score
+        self.hits += 1
+        self.misses = 0
+        self.last_seen = now
+
+
+class FaceTracker:
+    """
+    Associates face detections across analysed frames of one camera.
+
+    Existing tracks are moved forward with a constant-velocity model and matched to
+    new boxes greedily by IoU. Unmatched boxes start new tracks; tracks that go
+    unmatched in `max_misses` consecutive analysed frames, or that have not been seen
+    for `max_age` seconds, are dropped. The age limit bounds how long a departed
+    person's track can linger in a static scene, where the motion gate only lets a
+    frame through every keepalive period; it should exceed that period so a person
+    standing still keeps their track.
+    `update` reports a 'new' event the first time a track appears and, when
+    `quality_updates` is on, an 'improved' event whenever the face is seen noticeably
+    better than before.
+    """
+
+    _ids = itertools.count(1)  # Track ids are unique across cameras within a process
+
+    def __init__(self, iou_threshold=0.3, max_misses=5, max_age=45.0, quality_updates=True, improve_margin=0.2):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.max_age = max_age
+        self.quality_updates = quality_updates
+        self.improve_margin = improve_margin
+        self.tracks = []
+
+    def update(self, boxes, scores, now):
+        """Return a list of (event, track, box, score) for this frame's detections."""
+        events = []
+        # Expired tracks must not absorb a new person appearing at the same spot
+        self.tracks = [t for t in self.tracks if now - t.last_seen <= self.max_age]
+
+        matched_tracks, matched_boxes = set(), set()
+        if self.tracks and boxes:
+            predicted = [t.predict(now) for t in self.tracks]
+            ious = iou_matrix(predicted, boxes)
+            # Greedy assignment, highest overlap first
+            for flat in np.argsort(-ious, axis=None):
+                ti, bi = np.unravel_index(flat, ious.shape)
+                if ious[ti, bi] < self.iou_threshold:
+                    break
+                if ti in matched_tracks or bi in matched_boxes:
+                    continue
+                matched_tracks.add(ti)
+                matched_boxes.add(bi)
+
+                track = self.tracks[ti]
+                track.update(boxes[bi], scores[bi], now)
+                quality = box_quality(boxes[bi], scores[bi])
+                if self.quality_updates and quality > track.best_quality * (1 + self.improve_margin):
+                    track.best_quality = quality
+                    events.append(('improved', track, boxes[bi], scores[bi]))
+
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+        for bi, (box, score) in enumerate(zip(boxes, scores)):
+            if bi in matched_boxes:
+                continue
+            track = Track(next(self._ids), box, score, now)
+            self.tracks.append(track)
+            events.append(('new', track, box, score))
+
+        return events
+
+    def active_tracks(self):
+        return [{'track_id': t.track_id, 'box': t.box.tolist(), 'hits': t.hits, 'last_seen': t.last_seen}
+                for t in self.tracks]
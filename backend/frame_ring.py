@@ -0,0 +1,259 @@
+import secrets
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+DEFAULT_SLOTS = 4
+_RETIRED = -1  # control generation of a ring whose producer has gone
+_CONTROL_SIZE = 4 * 8
+
+
+def ring_name(prefix, camera_id):
+    """Shared memory name of a camera's ring; must be identical in producer and consumers."""
+    safe_id = ''.join(c if c.isalnum() else '_' for c in str(camera_id))
+    return f"{prefix}_{safe_id}"
+
+
+def _segment_name(name, token, generation):
+    return f"{name}_{token:x}_{generation}"
+
+
+def _release(segment):
+    """Close a segment mapping; if frame views into it are still alive, leave the unmapping to the GC."""
+    try:
+        segment.close()
+    except BufferError:
+        pass
+
+
+def _attach(name):
+    """Open an existing segment without handing its lifetime to this process's resource tracker."""
+    segment = shared_memory.SharedMemory(name=name)
+    # Before Python 3.13 every attaching process registers the segment and unlinks it at
+    # exit, which would destroy the producer's ring; only the producer owns it
+    try:
+        resource_tracker.unregister(segment._name, 'shared_memory')
+    except Exception:
+        pass
+    return segment
+
+
+class _RingLayout:
+    """
+    NumPy views over one data segment:
+    seqs[0] is the latest published sequence number, seqs[1 + slot] the sequence number
+    held by a slot (negative while it is being written); stamps and shapes describe each
+    slot's frame; frames[slot] is the raw slot storage of `capacity` bytes.
+    """
+
+    def __init__(self, buffer, slots, capacity):
+        offset = 0
+        self.seqs = np.ndarray((slots + 1,), dtype=np.int64, buffer=buffer, offset=offset)
+        offset += self.seqs.nbytes
+        self.stamps = np.ndarray((slots,), dtype=np.float64, buffer=buffer, offset=offset)
+        offset += self.stamps.nbytes
+        self.shapes = np.ndarray((slots, 3), dtype=np.int64, buffer=buffer, offset=offset)
+        offset += self.shapes.nbytes
+        self.frames = np.ndarray((slots, capacity), dtype=np.uint8, buffer=buffer, offset=offset)
+        self.slots = slots
+        self.capacity = capacity
+
+    @staticmethod
+    def size(slots, capacity):
+        return 8 * (slots + 1) + 8 * slots + 8 * 3 * slots + slots * capacity
+
+
+class FrameRing:
+    """
+    Producer side of a shared-memory ring of decoded frames (uint8 images).
+
+    `slots` preallocated frame buffers live in one multiprocessing.shared_memory segment.
+    write() copies a frame into the next slot, round robin, and publishes its sequence
+    number: the newest frame always wins and a slow consumer simply skips frames; nothing
+    queues. Any number of processes can map the ring with FrameRingReader and read frames
+    as NumPy views, without copying or pickling.
+
+    A small control segment named `name` holds the producer token, generation, slot count
+    and slot capacity; the frames live in `<name>_<token>_<generation>`. The data segment
+    is sized from the first frame and replaced by a new generation if a larger frame
+    arrives (e.g. the camera changed resolution); readers follow it automatically.
+
+    A new producer for the same name (a restarted camera or worker) retires the previous
+    control segment and takes the name over; the old producer's writes then go nowhere.
+    """
+
+    def __init__(self, name, slots=DEFAULT_SLOTS):
+        self.name = name
+        self.slots = slots
+        self.token = secrets.randbits(32)
+        self.seq = 0
+        self.generation = 0
+        self.segment = None
+        self.layout = None
+        try:
+            self.control = shared_memory.SharedMemory(name=name, create=True, size=_CONTROL_SIZE)
+        except FileExistsError:
+            # Left behind by a crashed producer, or one that is still shutting down
+            stale = shared_memory.SharedMemory(name=name)
+            np.ndarray((1,), dtype=np.int64, buffer=stale.buf)[0] = _RETIRED
+            stale.close()
+            stale.unlink()
+            self.control = shared_memory.SharedMemory(name=name, create=True, size=_CONTROL_SIZE)
+        self.control_header = np.ndarray((4,), dtype=np.int64, buffer=self.control.buf)
+        self.control_header[:] = (0, self.token, slots, 0)
+
+    @property
+    def superseded(self):
+        return self.control_header is None or self.control_header[0] == _RETIRED
+
+    def _allocate(self, capacity):
+        old = self.segment
+        self.generation += 1
+        size = _RingLayout.size(self.slots, capacity)
+        self.segment = shared_memory.SharedMemory(
+            name=_segment_name(self.name, self.token, self.generation), create=True, size=size)
+        self.layout = _RingLayout(self.segment.buf, self.slots, capacity)
+        self.layout.seqs[:] = 0
+        # Capacity first: a reader that sees the new generation must size its views from it
+        self.control_header[3] = capacity
+        self.control_header[0] = self.generation
+        if old is not None:
+            # Readers still mapping the old generation keep a valid mapping until they move on
+            old.close()
+            old.unlink()
+
+    def write(self, frame, timestamp=None):
+        """Publish a frame and return its sequence number (0 if another producer took over the ring)."""
+        if self.superseded:
+            return 0
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if self.layout is None or frame.nbytes > self.layout.capacity:
+            self._allocate(frame.nbytes)
+        layout = self.layout
+        seq = self.seq + 1
+        slot = seq % self.slots
+
+        # Mark the slot as being written, fill it, then publish: readers check the slot
+        # sequence number before and after reading it (and zero-copy readers again after
+        # use, with is_current), so a half-written or overwritten frame is never trusted
+        layout.seqs[1 + slot] = -seq
+        layout.frames[slot, :frame.nbytes] = frame.reshape(-1)
+        height, width = frame.shape[:2]
+        layout.shapes[slot] = (height, width, frame.shape[2] if frame.ndim == 3 else 0)
+        layout.stamps[slot] = time.time() if timestamp is None else timestamp
+        layout.seqs[1 + slot] = seq
+        layout.seqs[0] = seq
+        self.seq = seq
+        return seq
+
+    def close(self):
+        """Release and unlink the ring. Readers wait for a new producer afterwards."""
+        if self.control is None:
+            return
+        owner = not self.superseded
+        self.control_header[0] = _RETIRED
+        self.control_header = self.layout = None
+        if self.segment is not None:
+            self.segment.close()
+            self.segment.unlink()
+            self.segment = None
+        self.control.close()
+        if owner:
+            # Once taken over, the name belongs to the new producer's control segment
+            self.control.unlink()
+        self.control = None
+
+
+class FrameRingReader:
+    """
+    Consumer side of a FrameRing. read_latest() returns the newest frame as a read-only
+    NumPy view straight into shared memory, or as a validated private copy. A view stays
+    intact only until the producer laps the ring (`slots` - 1 newer frames), so consumers
+    that hold a frame or work on it for long should copy it, or check is_current(seq)
+    after using it and drop the result if it fails.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.control = None
+        self.segment = None
+        self.layout = None
+        self.generation = None
+
+    def _refresh(self):
+        """(Re)attach to the producer's current data segment. Returns False if there is none yet."""
+        for _ in range(2):
+            try:
+                if self.control is None:
+                    self.control = _attach(self.name)
+                generation, token, slots, capacity = (
+                    int(v) for v in np.ndarray((4,), dtype=np.int64, buffer=self.control.buf))
+            except FileNotFoundError:
+                return False
+            if generation != _RETIRED:
+                break
+            # The producer went away or was replaced; a new one creates a fresh control segment
+            self.close()
+        else:
+            return False
+        if generation == 0:
+            return False
+        if (token, generation) != self.generation:
+            self._close_segment()
+            try:
+                self.segment = _attach(_segment_name(self.name, token, generation))
+            except FileNotFoundError:
+                return False
+            self.layout = _RingLayout(self.segment.buf, slots, capacity)
+            self.generation = (token, generation)
+        return True
+
+    def read_latest(self, min_seq=0, copy=False):
+        """
+        Return (frame, seq, timestamp) for the newest published frame, or (None, 0, None)
+        if there is none newer than `min_seq`.
+
+        By default the frame is a read-only view that is only guaranteed intact at return
+        time; a consumer that works on it for longer must check is_current(seq) after use
+        and discard its result if that fails. With `copy`, the frame is copied out of the
+        ring and validated after the copy, so it can be kept for as long as needed.
+        """
+        if not self._refresh():
+            return None, 0, None
+        layout = self.layout
+        for _ in range(3):
+            seq = int(layout.seqs[0])
+            if seq <= min_seq:
+                return None, seq, None
+            slot = seq % layout.slots
+            if int(layout.seqs[1 + slot]) != seq:
+                continue  # Already being overwritten
+            height, width, channels = (int(v) for v in layout.shapes[slot])
+            timestamp = float(layout.stamps[slot])
+            shape = (height, width, channels) if channels else (height, width)
+            frame = layout.frames[slot, :height * width * max(channels, 1)].reshape(shape)
+            if copy:
+                frame = frame.copy()
+            # Checked again after reading: the producer may have started overwriting the slot
+            if int(layout.seqs[1 + slot]) == seq:
+                frame.flags.writeable = copy
+                return frame, seq, timestamp
+        return None, 0, None
+
+    def is_current(self, seq):
+        """Whether the frame with sequence number `seq` is still intact in its slot."""
+        layout = self.layout
+        return layout is not None and int(layout.seqs[1 + seq % layout.slots]) == seq
+
+    def _close_segment(self):
+        if self.segment is not None:
+            self.layout = self.generation = None
+            _release(self.segment)
+            self.segment = None
+
+    def close(self):
+        self._close_segment()
+        if self.control is not None:
+            _release(self.control)
+            self.control = None
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:  # CPU headroom falls back to the load average
+    psutil = None
+
+
+def cpu_usage():
+    """System-wide CPU utilisation in [0, 1], measured since the previous call."""
+    if psutil is not None:
+        return psutil.cpu_percent(interval=None) / 100.0
+    try:
+        return min(os.getloadavg()[0] / (os.cpu_count() or 1), 1.0)
+    except (AttributeError, OSError):  # Windows without psutil
+        return 0.0
+
+
+class AdaptiveScheduler:
+    """
+    Decides how often each camera is analysed and at which detector input size.
+
+    - Cameras that showed a face in the last `active_hold` seconds are analysed every
+      `active_interval` seconds, idle ones every `idle_interval` seconds.
+    - No camera is analysed faster than the measured detection latency, and all
+      intervals are stretched while CPU usage stays above `target_cpu`.
+    - When frames wait more than `lag_budget` seconds for the detector (their age at the
+      end of the batch minus the batch's own latency), or a batch
+      takes longer than `latency_budget`, the pipeline is behind real time: after
+      `step_down_after` such ticks the input size drops one step. A slow detector by
+      itself only stretches the intervals above; it is not a reason to shrink the input.
+    - The size only climbs back after `step_up_after` consecutive ticks in which the
+      latency predicted at the next larger size (cost grows with the input area) still
+      fits comfortably within the budget, so it does not oscillate between two sizes.
+    """
+
+    def __init__(self, detector, input_sizes=(640, 480, 416, 320, 256), active_interval=0.2,
+                 idle_interval=2.0, active_hold=10.0, target_cpu=0.85, lag_budget=0.5, latency_budget=1.0,
+                 step_down_after=3, step_up_after=30, step_up_margin=0.8, smoothing=0.2):
+        self.detector = detector
+        self.input_sizes = sorted(input_sizes, reverse=True)
+        self.active_interval = active_interval
+        self.idle_interval = idle_interval
+        self.active_hold = active_hold
+        self.target_cpu = target_cpu
+        self.lag_budget = lag_budget
+        self.latency_budget = latency_budget
+        self.step_up_margin = step_up_margin
+        self.step_down_after = step_down_after
+        self.step_up_after = step_up_after
+        self.smoothing = smoothing
+
+        # Start from the configured size, or the closest allowed one below it
+        allowed = [s for s in self.input_sizes if s <= detector.input_size]
+        self.size_index = self.input_sizes.index(allowed[0]) if allowed else len(self.input_sizes) - 1
+        detector.input_size = self.input_sizes[self.size_index]
+
+        self.latency = None  # EMA of batch detection latency in seconds
+        self.frame_lag = 0.0  # EMA of the time frames wait for the detector, in seconds
+        self.cpu = 0.0
+        self.cpu_backoff = 1.0
+        self.behind_ticks = 0
+        self.ahead_ticks = 0
+        self.last_face_time = {}
+        self.last_change = None
+        self.lock = threading.Lock()
+
+    def interval_for(self, camera_id, now=None):
+        """Minimum number of seconds between two analysed frames of this camera."""
+        now = time.time() if now is None else now
+        with self.lock:
+            active = now - self.last_face_time.get(camera_id, float('-inf')) < self.active_hold
+            interval = self.active_interval if active else self.idle_interval
+            if self.latency is not None:
+                interval = max(interval, self.latency)
+            return interval * self.cpu_backoff
+
+    def record(self, latency, results, now=None):
+        """
+        Feed back one detection tick.
+
+        `results` is a list of (camera_id, faces_found, frame_age) tuples, one per
+        frame of the batch, with the frame age measured when the batch finished.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            a = self.smoothing
+            self.latency = latency if self.latency is None else (1 - a) * self.latency + a * latency
+            if results:
+                # The batch's own latency is accounted for separately
+                lag = max(0.0, max(frame_age for _, _, frame_age in results) - latency)
+                self.frame_lag = (1 - a) * self.frame_lag + a * lag
+            for camera_id, faces_found, _ in results:
+                if faces_found:
+                    self.last_face_time[camera_id] = now
+
+            # Multiplicative back-off while the machine has no CPU headroom left
+            self.cpu = cpu_usage()
+            if self.cpu > self.target_cpu:
+                self.cpu_backoff = min(self.cpu_backoff * 1.25, 8.0)
+            else:
+                self.cpu_backoff = max(self.cpu_backoff / 1.25, 1.0)
+
+            self._adjust_input_size(now)
+
+    def _adjust_input_size(self, now):
+        behind = self.frame_lag > self.lag_budget or self.latency > self.latency_budget
+        ahead = False
+        if self.size_index > 0:
+            growth = (self.input_sizes[self.size_index - 1] / self.input_sizes[self.size_index]) ** 2
+            ahead = (self.frame_lag < self.lag_budget / 2
+                     and self.latency * growth < self.latency_budget * self.step_up_margin)
+
+        self.behind_ticks = self.behind_ticks + 1 if behind else 0
+        self.ahead_ticks = self.ahead_ticks + 1 if ahead else 0
+
+        if self.behind_ticks >= self.step_down_after and self.size_index < len(self.input_sizes) - 1:
+            self._set_size_index(self.size_index + 1, now, 'behind real time')
+        elif self.ahead_ticks >= self.step_up_after and self.size_index > 0:
+            self._set_size_index(self.size_index - 1, now, 'latency headroom')
+
+    def _set_size_index(self, index, now, reason):
+        previous = self.input_sizes[self.size_index]
+        self.size_index = index
+        self.detector.input_size = self.input_sizes[index]
+        self.behind_ticks = self.ahead_ticks = 0
+        self.last_change = {
+            'time': now,
+            'from': previous,
+            'to': self.input_sizes[index],
+            'reason': reason,
+        }
+        print(f"Scheduler: input size {previous} -> {self.input_sizes[index]} ({reason})")
+
+    def state(self, camera_ids=()):
+        """Current decisions and the measurements behind them, for the API."""
+        now = time.time()
+        intervals = {camera_id: self.interval_for(camera_id, now) for camera_id in camera_ids}
+        with self.lock:
+            return {
+                'input_size': self.input_sizes[self.size_index],
+                'input_sizes': self.input_sizes,
+                'latency': self.latency,
+                'latency_budget': self.latency_budget,
+                'frame_lag': self.frame_lag,
+                'cpu': self.cpu,
+                'cpu_backoff': self.cpu_backoff,
+                'intervals': intervals,
+                'active_cameras': [c for c, t in self.last_face_time.items() if now - t < self.active_hold],
+                'last_change': self.last_change,
+            }
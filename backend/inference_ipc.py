@@ -0,0 +1,234 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener, answer_challenge, deliver_challenge
+
+DEFAULT_PORT = 6001
+
+
+def default_address():
+    """A Unix socket in instance/ where the platform has them, else a localhost TCP port."""
+    if hasattr(socket, 'AF_UNIX'):
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'pipeline.sock')
+    return f"127.0.0.1:{DEFAULT_PORT}"
+
+
+def parse_address(text):
+    """'host:port' becomes a TCP address tuple; anything else is a Unix socket path."""
+    host, _, port = text.rpartition(':')
+    if host and port.isdigit():
+        return host, int(port)
+    return text
+
+
+def format_address(address):
+    return f"{address[0]}:{address[1]}" if isinstance(address, tuple) else address
+
+
+class InferenceHub:
+    """
+    Web-process end of the inference IPC channel.
+
+    Worker processes connect to a local, authenticated multiprocessing.connection socket
+    (a Unix socket readable only by this user, or localhost TCP where there is none),
+    introduce themselves with ('hello', index) and then push ('status', data) and result
+    messages of the form (kind, *payload), which are dispatched to the handlers
+    registered with on(). broadcast() sends commands to every connected worker. Each
+    connection has its own thread, which also runs the authentication and hello
+    handshake, so neither a busy worker nor a client that stalls mid-handshake delays
+    the others, and request threads only ever touch the small, already-received results.
+    """
+
+    def __init__(self, address, authkey, restart_delay=5.0, handshake_timeout=10.0):
+        self.address = address
+        self.authkey = authkey
+        self.restart_delay = restart_delay
+        self.handshake_timeout = handshake_timeout
+        self.handlers = {}
+        self.connections = {}  # worker index -> (connection, send lock)
+        self.status = {}  # worker index -> latest status message
+        self.processes = {}
+        self.lock = threading.Lock()
+        self.listener = None
+        self.counters = {'messages': 0, 'connects': 0, 'restarts': 0}
+
+    def on(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def start(self):
+        if isinstance(self.address, tuple):
+            # Authentication happens per connection in _serve(), not in accept()
+            self.listener = Listener(self.address)
+        else:
+            os.makedirs(os.path.dirname(self.address) or '.', exist_ok=True)
+            if os.path.exists(self.address):
+                os.unlink(self.address)  # Left behind by a previous run
+            # Create the socket owner-only from the start, not just chmod it afterwards
+            umask = os.umask(0o177)
+            try:
+                self.listener = Listener(self.address, family='AF_UNIX')
+            finally:
+                os.umask(umask)
+            os.chmod(self.address, 0o600)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def spawn_workers(self, script, count):
+        """
+        Start `count` worker processes running `script` (inference_worker.py) and restart any
+        that exit. Workers are fresh interpreters, so they inherit no threads, locks or CUDA
+        state, and do not re-import the web process's main module.
+        """
+        # The key goes through the environment, never the command line other users can see
+        env = dict(os.environ, PIPELINE_AUTHKEY=self.authkey.decode())
+
+        def spawn(index):
+            self.processes[index] = subprocess.Popen(
+                [sys.executable, script, '--index', str(index), '--count', str(count),
+                 '--address', format_address(self.address)], env=env)
+
+        for index in range(count):
+            spawn(index)
+
+        def supervise():
+            while True:
+                time.sleep(self.restart_delay)
+                for index, process in list(self.processes.items()):
+                    if process.poll() is not None:
+                        print(f"Inference worker {index} exited with code {process.returncode}; restarting")
+                        self.counters['restarts'] += 1
+                        spawn(index)
+
+        threading.Thread(target=supervise, daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                connection = self.listener.accept()
+            except Exception as e:
+                print(f"Error accepting inference worker connection: {e}")
+                continue
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        try:
+            deliver_challenge(connection, self.authkey)
+            if not connection.poll(self.handshake_timeout):
+                raise TimeoutError("no authentication challenge")
+            answer_challenge(connection, self.authkey)
+            if not connection.poll(self.handshake_timeout):
+                raise TimeoutError("no hello")
+            kind, index = connection.recv()
+            if kind != 'hello':
+                raise ValueError(f"expected hello, got {kind!r}")
+        except Exception as e:
+            print(f"Rejected inference worker connection: {e}")
+            connection.close()
+            return
+        with self.lock:
+            self.connections[index] = (connection, threading.Lock())
+            self.counters['connects'] += 1
+        self._read(index, connection)
+
+    def _read(self, index, connection):
+        while True:
+            try:
+                message = connection.recv()
+            except (EOFError, OSError):
+                break
+            self.counters['messages'] += 1
+            kind, payload = message[0], message[1:]
+            if kind == 'status':
+                with self.lock:
+                    self.status[index] = payload[0]
+                continue
+            handler = self.handlers.get(kind)
+            if handler is None:
+                continue
+            try:
+                handler(*payload)
+            except Exception as e:
+                print(f"Error handling {kind} from inference worker {index}: {e}")
+        with self.lock:
+            if self.connections.get(index, (None,))[0] is connection:
+                del self.connections[index]
+                self.status.pop(index, None)
+
+    def broadcast(self, kind, *payload):
+        with self.lock:
+            connections = list(self.connections.items())
+        for index, (connection, send_lock) in connections:
+            try:
+                with send_lock:
+                    connection.send((kind,) + payload)
+            except (OSError, ValueError) as e:
+                print(f"Could not send {kind} to inference worker {index}: {e}")
+
+    def worker_status(self):
+        """Copy of the latest status message of every connected worker, keyed by worker index."""
+        with self.lock:
+            return dict(self.status)
+
+    def stats(self):
+        with self.lock:
+            connected = set(self.connections)
+        workers = {index: {'pid': process.pid, 'alive': process.poll() is None, 'connected': index in connected}
+                   for index, process in self.processes.items()}
+        return dict(self.counters, workers=workers)
+
+
+class WorkerChannel:
+    """
+    Worker-process end of the inference IPC channel: sends results to the web process
+    and dispatches its commands to handlers registered with on(). When the web process
+    goes away, `on_close` is called (the inference worker exits there).
+    """
+
+    def __init__(self, address, authkey, index, connect_timeout=60.0, on_close=None):
+        self.index = index
+        self.handlers = {}
+        self.send_lock = threading.Lock()
+        self.on_close = on_close
+        self.dropped = 0
+        deadline = time.time() + connect_timeout
+        while True:
+            try:
+                self.connection = Client(address, authkey=authkey)
+                break
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The web process may still be starting its listener
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.5)
+        self.connection.send(('hello', index))
+
+    def on(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def send(self, kind, *payload):
+        try:
+            with self.send_lock:
+                self.connection.send((kind,) + payload)
+        except (OSError, ValueError):
+            self.dropped += 1
+
+    def start(self):
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        while True:
+            try:
+                kind, *payload = self.connection.recv()
+            except (EOFError, OSError):
+                break
+            handler = self.handlers.get(kind)
+            if handler is None:
+                continue
+            try:
+                handler(*payload)
+            except Exception as e:
+                print(f"Error handling {kind} in inference worker {self.index}: {e}")
+        if self.on_close is not None:
+            self.on_close()
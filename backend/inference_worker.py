@@ -0,0 +1,39 @@
+"""
+Inference worker process for PIPELINE_MODE=worker.
+
+The web process (python app.py with PIPELINE_MODE=worker) starts one per configured
+worker with the command below and restarts them if they exit. To run workers under a
+separate supervisor instead, set PIPELINE_SPAWN_WORKERS=0 and the same secret
+PIPELINE_AUTHKEY (and PIPELINE_ADDRESS, if changed) on the web process and every worker,
+and start each worker with:
+
+    python inference_worker.py --index 0 --count 2
+"""
+import argparse
+import os
+
+from inference_ipc import default_address, parse_address
+
+
+def run(index, count, address, authkey):
+    # Must be set before app is imported: it decides whether this process loads the detector
+    os.environ['PIPELINE_ROLE'] = 'worker'
+    import app as pipeline
+    pipeline.run_inference_worker(index, count, address, authkey)
+
+
+def parse_opt():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--index', type=int, default=0, help='this worker, 0 <= index < count')
+    parser.add_argument('--count', type=int, default=1, help='total number of inference workers')
+    parser.add_argument('--address', type=str, default=os.environ.get('PIPELINE_ADDRESS') or default_address(),
+                        help='web process IPC socket path, or host:port')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    opt = parse_opt()
+    authkey = os.environ.get('PIPELINE_AUTHKEY')
+    if not authkey:
+        raise SystemExit("PIPELINE_AUTHKEY is not set; it must match the web process's key.")
+    run(opt.index, opt.count, parse_address(opt.address), authkey.encode())
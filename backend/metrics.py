@@ -0,0 +1,268 @@
+import bisect
+import math
+import threading
+
+# Seconds; spans a fast NMS pass up to a stalled RTSP read
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name):
+        return [(name, (), self.value)]
+
+
+class _GaugeChild:
+    __slots__ = ('value', 'function')
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set_function(self, function):
+        """Read the value from `function` at collection time instead of storing it."""
+        self.function = function
+
+    def samples(self, name):
+        return [(name, (), self.function() if self.function is not None else self.value)]
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # The last one is the +Inf bucket
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def samples(self, name):
+        samples, cumulative = [], 0
+        for bound, count in zip(self.bounds + (math.inf,), self.counts):
+            cumulative += count
+            samples.append((f"{name}_bucket", (('le', bound),), cumulative))
+        samples.append((f"{name}_sum", (), self.sum))
+        samples.append((f"{name}_count", (), cumulative))
+        return samples
+
+
+class _Metric:
+    """
+    A metric family: one child (the actual counter, gauge or histogram) per combination
+    of label values. labels() creates children on first use; hot paths should look the
+    child up once and keep it. Unlabelled metrics forward inc/set/observe to their only child.
+    """
+
+    type_name = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        key = tuple('' if value is None else str(value) for value in values)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self.lock:
+                child = self.children.setdefault(key, self._new_child())
+        return child
+
+    def remove(self, *values):
+        with self.lock:
+            self.children.pop(tuple('' if value is None else str(value) for value in values), None)
+
+    def clear(self):
+        with self.lock:
+            self.children = {}
+
+    def collect(self):
+        with self.lock:
+            children = list(self.children.items())
+        samples = []
+        for key, child in children:
+            labels = tuple(zip(self.labelnames, key))
+            samples.extend((name, labels + extra, value) for name, extra, value in child.samples(self.name))
+        return {'name': self.name, 'type': self.type_name, 'help': self.help_text, 'samples': samples}
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    type_name = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms of one process, rendered in the Prometheus text format.
+
+    Recording is a few attribute updates without locking, so it is cheap enough for the
+    per-frame path; under heavy thread contention an increment can very rarely be lost,
+    which is acceptable for monitoring. collect() returns plain data, so a worker process
+    can ship its metrics to the web process, which renders them with render_families().
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric):
+        with self.lock:
+            if metric.name in self.metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def collect(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return [metric.collect() for metric in metrics]
+
+    def render(self, extra_families=()):
+        return render_families(self.collect() + list(extra_families))
+
+
+def with_labels(families, **labels):
+    """Copy of collected families with extra labels on every sample, e.g. worker="0"."""
+    extra = tuple((key, str(value)) for key, value in labels.items())
+    return [dict(family, samples=[(name, extra + sample_labels, value)
+                                  for name, sample_labels, value in family['samples']])
+            for family in families]
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value, quotes=True):
+    value = value.replace('\\', '\\\\').replace('\n', '\\n')
+    return value.replace('"', '\\"') if quotes else value
+
+
+def render_families(families):
+    """Prometheus text exposition (version 0.0.4); families with the same name are merged."""
+    merged = {}
+    for family in families:
+        target = merged.setdefault(family['name'], dict(family, samples=[]))
+        target['samples'].extend(family['samples'])
+
+    lines = []
+    for family in merged.values():
+        lines.append(f"# HELP {family['name']} {_escape(family['help'], quotes=False)}")
+        lines.append(f"# TYPE {family['name']} {family['type']}")
+        for name, labels, value in family['samples']:
+            if labels:
+                label_text = ','.join(
+                    f'{key}="{_format_value(v) if key == "le" else _escape(v)}"' for key, v in labels)
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}")
+            else:
+                lines.append(f"{name} {_format_value(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry and the live pipeline's metrics, by stage
+REGISTRY = MetricsRegistry()
+
+CAPTURE_SECONDS = REGISTRY.histogram(
+    'facedet_capture_seconds', 'Time to read and decode one frame from a camera stream.', ['camera'])
+CAPTURE_FAILURES = REGISTRY.counter(
+    'facedet_capture_failures_total', 'Failed frame reads (the stream is reconnected).', ['camera'])
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    'facedet_queue_wait_seconds', 'Time a captured frame waited before it was picked for analysis.', ['camera'])
+FRAMES_ANALYSED = REGISTRY.counter(
+    'facedet_frames_analysed_total', 'Frames passed to the face detector.', ['camera'])
+FACES_DETECTED = REGISTRY.counter(
+    'facedet_faces_detected_total', 'Faces found by the detector.', ['camera'])
+BATCH_SIZE = REGISTRY.histogram(
+    'facedet_batch_size', 'Frames per detector forward pass.', buckets=(1, 2, 4, 8, 16, 32))
+# One forward pass covers frames of several cameras, so detector stages are per batch
+PREPROCESS_SECONDS = REGISTRY.histogram(
+    'facedet_preprocess_seconds', 'Letterboxing and tensor conversion per detector batch.')
+INFERENCE_SECONDS = REGISTRY.histogram(
+    'facedet_inference_seconds', 'Model forward pass per detector batch.')
+NMS_SECONDS = REGISTRY.histogram(
+    'facedet_nms_seconds', 'Confidence filtering, box rescaling and NMS per detector batch.')
+ENCODE_SECONDS = REGISTRY.histogram(
+    'facedet_encode_seconds', 'JPEG encoding of one snapshot or stream frame.', ['kind', 'camera'])
+DB_WRITE_SECONDS = REGISTRY.histogram(
+    'facedet_db_write_seconds', 'Database transaction of one snapshot writer batch, including the lock wait.')
+FRAME_TO_EVENT_SECONDS = REGISTRY.histogram(
+    'facedet_frame_to_event_seconds', 'Latency from frame capture to its published detections event.', ['camera'])
+SNAPSHOT_QUEUE_DEPTH = REGISTRY.gauge(
+    'facedet_snapshot_queue_depth', 'Snapshots and rewrites waiting in the snapshot writer.')
+CAMERA_CONNECTED = REGISTRY.gauge(
+    'facedet_camera_connected', 'Whether a camera currently delivers frames (1) or not (0).', ['camera'])
@@ -7,18 +7,59 @@ db = SQLAlchemy()
 
 class Snapshot(db.Model):
     __tablename__ = 'snapshots'
+    __table_args__ = (
+        # Keyset pagination and date-range filters walk (timestamp, id) in index order
+        db.Index('ix_snapshots_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_snapshots_camera_timestamp_id', 'camera_id', 'timestamp', 'id'),
+        db.Index('ix_snapshots_image_path', 'image_path'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     image_path = db.Column(db.String(255), nullable=False)
+    camera_id = db.Column(db.String(64), nullable=True)
+    track_id = db.Column(db.Integer, nullable=True)
+    size_bytes = db.Column(db.Integer, nullable=True)  # Image plus thumbnail, for the disk quota
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
+class SnapshotHourlyCount(db.Model):
+    """Snapshots per hour and camera, maintained on insert and delete (see snapshot_rollup)."""
+    __tablename__ = 'snapshot_hourly_counts'
+    hour = db.Column(db.DateTime, primary_key=True)
+    camera_id = db.Column(db.String(64), primary_key=True, default='')  # '' for snapshots without a camera
+    count = db.Column(db.Integer, nullable=False, default=0)
+
 class Blacklist(db.Model):
     __tablename__ = 'blacklist'
+    __table_args__ = (
+        db.Index('ix_blacklist_timestamp_id', 'timestamp', 'id'),
+        db.Index('ix_blacklist_snapshot_id', 'snapshot_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=True)
     image_path = db.Column(db.String(255), nullable=False)
+    snapshot_id = db.Column(db.Integer, nullable=True)  # Source snapshot, kept by quota eviction
+    embedding = db.Column(db.LargeBinary, nullable=True)  # float32 face encoding
     timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     timestamp_added = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
 
+class EmailOutbox(db.Model):
+    """Queued outgoing email, sent by email_outbox.EmailOutbox; survives restarts."""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_not_before', 'status', 'not_before'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False, default='')
+    attachments = db.Column(db.Text, nullable=False, default='[]')  # JSON list of image paths
+    digest_key = db.Column(db.String(255), nullable=True)  # Pending rows with the same key are sent as one digest
+    status = db.Column(db.String(16), nullable=False, default='pending')  # pending, sent or failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    not_before = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
 class Settings(db.Model):
     __tablename__ = 'settings'
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,77 @@
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap per-camera pre-filter that decides whether a frame is worth running YOLO on.
+
+    Frames are downscaled to `width` pixels, converted to grayscale and compared with a
+    running-average background model. A frame passes when at least `sensitivity` (a
+    fraction of the downscaled pixels) changed by more than `pixel_threshold` grey
+    levels; lower sensitivity values react to smaller changes. The changed region is
+    returned as a bounding box in original frame coordinates.
+
+    Because a person standing still is slowly absorbed into the background, a frame is
+    also let through at least every `keepalive` seconds.
+    """
+
+    def __init__(self, sensitivity=0.005, width=160, alpha=0.05, pixel_threshold=25, keepalive=30.0):
+        self.sensitivity = sensitivity
+        self.width = width
+        self.alpha = alpha
+        self.pixel_threshold = pixel_threshold
+        self.keepalive = keepalive
+        self.background = None
+        self.last_pass = 0.0
+        self.passed = 0
+        self.skipped = 0
+        self.last_changed_fraction = 0.0
+
+    def check(self, frame, now=None):
+        """Return (changed, box) where box is (x1, y1, x2, y2) of the changed region or None."""
+        now = time.time() if now is None else now
+        height0, width0 = frame.shape[:2]
+        height = max(1, int(round(height0 * self.width / width0)))
+
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+
+        if self.background is None or self.background.shape != gray.shape:
+            # First frame (or resolution change): seed the model and analyse the frame
+            self.background = gray.astype(np.float32)
+            return self._pass(now, None)
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        cv2.accumulateWeighted(gray, self.background, self.alpha)
+
+        changed = cv2.countNonZero(mask)
+        self.last_changed_fraction = changed / mask.size
+        if self.last_changed_fraction >= self.sensitivity:
+            x, y, w, h = cv2.boundingRect(mask)
+            sx, sy = width0 / self.width, height0 / height
+            box = (int(x * sx), int(y * sy), int(np.ceil((x + w) * sx)), int(np.ceil((y + h) * sy)))
+            return self._pass(now, box)
+
+        if now - self.last_pass >= self.keepalive:
+            return self._pass(now, None)
+
+        self.skipped += 1
+        return False, None
+
+    def _pass(self, now, box):
+        self.last_pass = now
+        self.passed += 1
+        return True, box
+
+    def stats(self):
+        return {
+            'passed': self.passed,
+            'skipped': self.skipped,
+            'changed_fraction': self.last_changed_fraction,
+            'sensitivity': self.sensitivity,
+        }
@@ -0,0 +1,37 @@
+import base64
+import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(item):
+    """Opaque cursor pointing just past `item` in (timestamp, id) order."""
+    raw = f"{item.timestamp.isoformat()}|{item.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (timestamp, id) from a cursor produced by encode_cursor. Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, item_id = raw.rsplit('|', 1)
+        return datetime.datetime.fromisoformat(timestamp), int(item_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def order_keyset(query, model, descending=True):
+    """Order by (timestamp, id), matching the composite index, so ties are stable."""
+    if descending:
+        return query.order_by(model.timestamp.desc(), model.id.desc())
+    return query.order_by(model.timestamp.asc(), model.id.asc())
+
+
+def after_cursor(query, model, cursor, descending=True):
+    """Restrict `query` to rows strictly after the cursor position in (timestamp, id) order."""
+    timestamp, item_id = decode_cursor(cursor)
+    if descending:
+        return query.filter(or_(model.timestamp < timestamp,
+                                and_(model.timestamp == timestamp, model.id < item_id)))
+    return query.filter(or_(model.timestamp > timestamp,
+                            and_(model.timestamp == timestamp, model.id > item_id)))
@@ -0,0 +1,290 @@
+import datetime
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import exists
+
+from models_tools import db, Snapshot, Blacklist
+from snapshot_rollup import record_deleted, deleted_counts
+from sqlite_tuning import serialized_write
+from snapshot_store import SNAPSHOT_ROOT, snapshot_path, remove_empty_dirs
+from thumbnails import THUMBNAIL_DIR, image_files_size, thumbnail_path
+
+
+def unlink_snapshot_files(image_path):
+    """Remove a snapshot image and its thumbnail. Returns the number of bytes freed."""
+    freed = 0
+    for path in (image_path, thumbnail_path(image_path)):
+        try:
+            size = os.stat(path).st_size
+            os.remove(path)
+            freed += size
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error deleting snapshot file {path}: {e}")
+    # Drop hour shards emptied by retention, but never the one the writer is filling
+    image_dir = os.path.dirname(image_path)
+    if image_dir != os.path.dirname(snapshot_path()):
+        remove_empty_dirs(image_dir, SNAPSHOT_ROOT)
+        remove_empty_dirs(os.path.dirname(thumbnail_path(image_path)), THUMBNAIL_DIR)
+    return freed
+
+
+def _limit(value):
+    value = value() if callable(value) else value
+    if value in (None, ''):
+        return None
+    value = float(value)
+    return value if value > 0 else None
+
+
+class RetentionWorker:
+    """
+    Deletes snapshots past the retention period or over the disk quota, in small,
+    bounded steps.
+
+    Each pass first removes snapshots older than `retention_days`, then, if the
+    snapshots still take more than `max_bytes`, evicts the oldest ones until usage
+    is `quota_headroom` below the quota. Either limit may be None (or 0) to disable
+    it; both apply together. Snapshots referenced by a blacklist entry are never
+    evicted for space.
+
+    Rows are walked in id order, `chunk_size` at a time. A chunk is one short
+    transaction: a bulk DELETE over its id range plus the matching rollup update, so
+    the SQLite write lock is never held for long and only one chunk of paths is in
+    memory. Image files are unlinked on a small thread pool after the chunk commits.
+    The paths of a committed chunk are checkpointed to `checkpoint_path` until their
+    files are gone, so a crash between the commit and the unlinks does not leak files:
+    the next pass finishes them first.
+
+    Disk usage is the sum of Snapshot.size_bytes, read once per pass and kept current
+    in between by snapshots_added/snapshots_resized; crossing the quota wakes the
+    worker early. `retention_days` and `max_bytes` are numbers or callables returning
+    one (e.g. read from settings on every pass). Listeners are called with the row
+    dicts of every deleted chunk.
+    """
+
+    def __init__(self, app, retention_days, max_bytes=None, quota_headroom=0.05, interval=3600,
+                 min_pass_gap=30, chunk_size=500, chunk_pause=0.05, unlink_workers=4,
+                 checkpoint_path='instance/retention_checkpoint.json'):
+        self.app = app
+        self.retention_days = retention_days
+        self.max_bytes = max_bytes
+        self.quota_headroom = quota_headroom
+        self.interval = interval
+        self.min_pass_gap = min_pass_gap
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self.unlink_workers = unlink_workers
+        self.checkpoint_path = checkpoint_path
+
+        self.listeners = []
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.used_bytes = None  # Unknown until the first pass
+        self.last_pass = None
+        self.totals = {'passes': 0, 'items': 0, 'evicted': 0, 'bytes': 0, 'errors': 0}
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=10):
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+            self.thread = None
+
+    def add_listener(self, listener):
+        """Register a callable that receives the list of deleted row dicts after each chunk."""
+        self.listeners.append(listener)
+
+    def snapshots_added(self, rows):
+        """Account for committed snapshot rows (dicts with size_bytes)."""
+        self.snapshots_resized(sum(row.get('size_bytes') or 0 for row in rows))
+
+    def snapshots_resized(self, delta):
+        """Account for snapshot files that grew or shrank by `delta` bytes in total."""
+        if not delta:
+            return
+        with self.lock:
+            if self.used_bytes is None:
+                return
+            self.used_bytes += delta
+            over_quota = self._over_quota(self.used_bytes)
+        if over_quota:
+            self.wake_event.set()
+
+    def _over_quota(self, used):
+        max_bytes = _limit(self.max_bytes)
+        return max_bytes is not None and used > max_bytes
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.run_pass()
+            except Exception as e:
+                self.totals['errors'] += 1
+                print(f"Error in retention pass: {e}")
+            # Quota wake-ups are rate limited: pinned snapshots alone may keep usage over the quota
+            self.stop_event.wait(self.min_pass_gap)
+            self.wake_event.wait(max(0.0, self.interval - self.min_pass_gap))
+            self.wake_event.clear()
+
+    def run_pass(self):
+        """Apply the age and size limits once and return the pass report."""
+        started = time.time()
+        report = {'items': 0, 'evicted': 0, 'bytes': 0, 'chunks': 0}
+
+        with ThreadPoolExecutor(max_workers=self.unlink_workers) as pool:
+            # Files of a chunk committed by an interrupted pass
+            pending = self._load_checkpoint()
+            if pending:
+                report['bytes'] += sum(pool.map(unlink_snapshot_files, pending))
+                self._save_checkpoint([])
+
+            days = _limit(self.retention_days)
+            if days is not None:
+                cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+                report['items'] += self._delete_all(pool, report, Snapshot.timestamp < cutoff)
+
+            self._refresh_usage()
+            max_bytes = _limit(self.max_bytes)
+            if max_bytes is not None and self.used_bytes > max_bytes:
+                # Evict down to a little under the quota so one new snapshot does not trigger another pass
+                target = max_bytes * (1.0 - self.quota_headroom)
+                unreferenced = ~exists().where(Blacklist.snapshot_id == Snapshot.id)
+                report['evicted'] += self._delete_all(pool, report, unreferenced,
+                                                      bytes_to_free=lambda: self.used_bytes - target)
+                report['items'] += report['evicted']
+
+        report['used_bytes'] = self.used_bytes
+        report['duration'] = time.time() - started
+        report['finished_at'] = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        with self.lock:
+            self.last_pass = report
+            self.totals['passes'] += 1
+            self.totals['items'] += report['items']
+            self.totals['evicted'] += report['evicted']
+            self.totals['bytes'] += report['bytes']
+        if report['items'] or report['bytes']:
+            print(f"Retention pass: deleted {report['items']} snapshots ({report['evicted']} for space), "
+                  f"freed {report['bytes']} bytes in {report['duration']:.2f}s")
+        return report
+
+    def _delete_all(self, pool, report, condition, bytes_to_free=None):
+        """Delete matching snapshots chunk by chunk, oldest first; with bytes_to_free, stop once enough is freed."""
+        deleted = 0
+        while not self.stop_event.is_set():
+            budget = bytes_to_free() if bytes_to_free is not None else None
+            if budget is not None and budget <= 0:
+                break
+            rows = self._delete_chunk(condition, budget)
+            if not rows:
+                break
+            paths = [row['image_path'] for row in rows]
+            report['bytes'] += sum(pool.map(unlink_snapshot_files, paths))
+            self._save_checkpoint([])
+            with self.lock:
+                if self.used_bytes is not None:
+                    self.used_bytes -= sum(row['size_bytes'] or 0 for row in rows)
+            deleted += len(rows)
+            report['chunks'] += 1
+            self._notify(rows)
+            # Give the snapshot writer a chance at the write lock between chunks
+            time.sleep(self.chunk_pause)
+        return deleted
+
+    def _delete_chunk(self, condition, byte_budget=None):
+        """
+        Delete up to `chunk_size` snapshots matching `condition`, lowest ids first, in one
+        transaction and return their rows. With `byte_budget`, the chunk ends at the first
+        row that brings the freed size to the budget.
+        """
+        with self.app.app_context(), serialized_write():
+            try:
+                rows = [
+                    {'id': id_, 'image_path': path, 'timestamp': ts, 'camera_id': camera_id, 'size_bytes': size}
+                    for id_, path, ts, camera_id, size in db.session.query(
+                        Snapshot.id, Snapshot.image_path, Snapshot.timestamp, Snapshot.camera_id,
+                        Snapshot.size_bytes
+                    ).filter(condition).order_by(Snapshot.id).limit(self.chunk_size)
+                ]
+                if byte_budget is not None:
+                    freed = 0
+                    for end, row in enumerate(rows):
+                        freed += row['size_bytes'] or 0
+                        if freed >= byte_budget:
+                            rows = rows[:end + 1]
+                            break
+                if not rows:
+                    return []
+                # Every matching row in [first, last] was selected above, so the range delete matches exactly
+                db.session.query(Snapshot).filter(
+                    Snapshot.id.between(rows[0]['id'], rows[-1]['id']),
+                    condition,
+                ).delete(synchronize_session=False)
+                record_deleted(db.session, deleted_counts(rows))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        # Once the rows are gone these paths are the only record of the files to remove
+        self._save_checkpoint([row['image_path'] for row in rows])
+        return rows
+
+    def _refresh_usage(self):
+        """Recompute disk usage from the database, measuring snapshots written before sizes were recorded."""
+        with self.app.app_context():
+            while not self.stop_event.is_set():
+                missing = db.session.query(Snapshot.id, Snapshot.image_path).filter(
+                    Snapshot.size_bytes.is_(None)).limit(self.chunk_size).all()
+                if not missing:
+                    break
+                sizes = [{'id': id_, 'size_bytes': image_files_size(path)} for id_, path in missing]
+                with serialized_write():
+                    db.session.bulk_update_mappings(Snapshot, sizes)
+                    db.session.commit()
+            used = db.session.query(db.func.coalesce(db.func.sum(Snapshot.size_bytes), 0)).scalar()
+        with self.lock:
+            self.used_bytes = int(used)
+
+    def _notify(self, rows):
+        for listener in self.listeners:
+            try:
+                listener(rows)
+            except Exception as e:
+                print(f"Error in retention listener: {e}")
+
+    def _load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f).get('pending_paths', [])
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable retention checkpoint: {e}")
+            return []
+
+    def _save_checkpoint(self, paths):
+        os.makedirs(os.path.dirname(self.checkpoint_path) or '.', exist_ok=True)
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({'pending_paths': paths}, f)
+        os.replace(tmp, self.checkpoint_path)
+
+    def stats(self):
+        with self.lock:
+            return dict(self.totals, last_pass=self.last_pass, chunk_size=self.chunk_size,
+                        used_bytes=self.used_bytes, max_bytes=_limit(self.max_bytes),
+                        running=self.thread is not None)
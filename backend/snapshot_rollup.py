@@ -0,0 +1,81 @@
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy.dialects.sqlite import insert
+
+from models_tools import db, Snapshot, SnapshotHourlyCount
+
+
+def hour_bucket(timestamp):
+    """Truncate a datetime to the start of its hour."""
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def _bucket_counts(rows):
+    # rows are dicts or Snapshot objects with timestamp and camera_id
+    counts = Counter()
+    for row in rows:
+        timestamp = row['timestamp'] if isinstance(row, dict) else row.timestamp
+        camera_id = row.get('camera_id') if isinstance(row, dict) else row.camera_id
+        counts[(hour_bucket(timestamp), camera_id or '')] += 1
+    return counts
+
+
+def record_inserted(session, rows):
+    """Add new snapshot rows to the hourly rollup, in the caller's transaction."""
+    for (hour, camera_id), count in _bucket_counts(rows).items():
+        statement = insert(SnapshotHourlyCount).values(hour=hour, camera_id=camera_id, count=count)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=['hour', 'camera_id'],
+            set_={'count': SnapshotHourlyCount.count + count},
+        ))
+
+
+def record_deleted(session, counts):
+    """
+    Subtract deleted snapshots from the hourly rollup, in the caller's transaction.
+    `counts` maps (hour, camera_id) to the number of rows deleted in that bucket.
+    """
+    for (hour, camera_id), count in counts.items():
+        key = (SnapshotHourlyCount.hour == hour, SnapshotHourlyCount.camera_id == (camera_id or ''))
+        session.query(SnapshotHourlyCount).filter(*key).update(
+            {SnapshotHourlyCount.count: SnapshotHourlyCount.count - count}, synchronize_session=False)
+        session.query(SnapshotHourlyCount).filter(*key, SnapshotHourlyCount.count <= 0).delete(
+            synchronize_session=False)
+
+
+def deleted_counts(snapshots):
+    """Bucket counts of Snapshot objects (or row dicts) about to be deleted, for record_deleted."""
+    return _bucket_counts(snapshots)
+
+
+def rebuild_rollup(session=None):
+    """Recompute the whole rollup from the snapshots table. Needs an app context."""
+    session = session or db.session
+    hour = db.func.strftime('%Y-%m-%d %H:00:00', Snapshot.timestamp)
+    camera_id = db.func.coalesce(Snapshot.camera_id, '')
+    buckets = session.query(hour, camera_id, db.func.count(Snapshot.id)).group_by(hour, camera_id).all()
+
+    session.query(SnapshotHourlyCount).delete(synchronize_session=False)
+    if buckets:
+        session.execute(insert(SnapshotHourlyCount), [
+            {'hour': datetime.strptime(h, '%Y-%m-%d %H:%M:%S'), 'camera_id': c, 'count': n}
+            for h, c, n in buckets
+        ])
+    session.commit()
+    return len(buckets)
+
+
+def hourly_counts(start=None, end=None, camera_id=None):
+    """
+    [(hour, count)] from the rollup, oldest first, summed over cameras unless
+    `camera_id` is given. `start` is inclusive and `end` exclusive.
+    """
+    query = db.session.query(SnapshotHourlyCount.hour, db.func.sum(SnapshotHourlyCount.count))
+    if start is not None:
+        query = query.filter(SnapshotHourlyCount.hour >= hour_bucket(start))
+    if end is not None:
+        query = query.filter(SnapshotHourlyCount.hour < end)
+    if camera_id is not None:
+        query = query.filter(SnapshotHourlyCount.camera_id == camera_id)
+    return query.group_by(SnapshotHourlyCount.hour).order_by(SnapshotHourlyCount.hour).all()
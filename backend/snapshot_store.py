@@ -0,0 +1,139 @@
+import datetime
+import hashlib
+import os
+import shutil
+
+from models_tools import db, Snapshot, Blacklist
+from thumbnails import thumbnail_path
+
+SNAPSHOT_ROOT = 'static/snapshots'
+BLACKLIST_ROOT = 'static/blacklist'
+
+
+def snapshot_path(now=None):
+    """
+    Path of a new snapshot image, sharded by hour so no directory grows past one hour
+    of captures: static/snapshots/YYYY/MM/DD/HH/<HHMMSS_micro>.jpg.
+    """
+    now = now or datetime.datetime.now()
+    return f"{SNAPSHOT_ROOT}/{now:%Y/%m/%d/%H}/{now:%Y%m%d_%H%M%S_%f}.jpg"
+
+
+def sharded_path(image_path, timestamp):
+    """Sharded location of a snapshot written flat into SNAPSHOT_ROOT by older versions."""
+    name = os.path.basename(image_path)
+    try:
+        # Old names are the local capture time, which is what new shards use too
+        timestamp = datetime.datetime.strptime(os.path.splitext(name)[0], '%Y%m%d_%H%M%S_%f')
+    except ValueError:
+        pass
+    return f"{SNAPSHOT_ROOT}/{timestamp:%Y/%m/%d/%H}/{name}"
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def blob_path(digest, root=BLACKLIST_ROOT):
+    """Content-addressed path of an image: static/blacklist/ab/<sha256>.jpg."""
+    return f"{root}/{digest[:2]}/{digest}.jpg"
+
+
+def link_or_copy(source, destination):
+    """Hard link `source` to `destination` (atomically), copying only across filesystems."""
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    tmp = f"{destination}.tmp"
+    try:
+        os.link(source, tmp)
+    except FileExistsError:
+        os.remove(tmp)
+        os.link(source, tmp)
+    except OSError:
+        shutil.copyfile(source, tmp)
+    os.replace(tmp, destination)
+
+
+def store_blacklist_image(source_path, remove_source=False):
+    """
+    Add an image to the content-addressed blacklist store and return its path. Identical
+    images share one file; a new image is hard-linked from `source_path`, not copied, so
+    blacklisting a snapshot costs no extra disk space.
+    """
+    destination = blob_path(file_sha256(source_path))
+    if not os.path.exists(destination):
+        link_or_copy(source_path, destination)
+    if remove_source and os.path.abspath(source_path) != os.path.abspath(destination):
+        os.remove(source_path)
+    return destination
+
+
+def remove_empty_dirs(path, root):
+    """Remove `path` and its empty parents up to (not including) `root`."""
+    root = os.path.abspath(root)
+    path = os.path.abspath(path)
+    while path.startswith(root + os.sep):
+        try:
+            os.rmdir(path)
+        except OSError:
+            return
+        path = os.path.dirname(path)
+
+
+def _move(source, destination):
+    if os.path.exists(source):
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(source, destination)
+
+
+def migrate_flat_snapshots(chunk_size=500):
+    """
+    Move snapshots stored flat in SNAPSHOT_ROOT, with their thumbnails, into hour shards
+    and rewrite Snapshot.image_path, one chunk per transaction. Safe to interrupt and
+    re-run. Needs an app context. Returns the number of rows migrated.
+    """
+    migrated = 0
+    while True:
+        rows = db.session.query(Snapshot.id, Snapshot.image_path, Snapshot.timestamp).filter(
+            Snapshot.image_path.like(f"{SNAPSHOT_ROOT}/%"),
+            ~Snapshot.image_path.like(f"{SNAPSHOT_ROOT}/%/%"),
+        ).order_by(Snapshot.id).limit(chunk_size).all()
+        if not rows:
+            return migrated
+        updates = []
+        for snapshot_id, old_path, timestamp in rows:
+            new_path = sharded_path(old_path, timestamp)
+            _move(old_path, new_path)
+            _move(thumbnail_path(old_path), thumbnail_path(new_path))
+            updates.append({'id': snapshot_id, 'image_path': new_path})
+        db.session.bulk_update_mappings(Snapshot, updates)
+        db.session.commit()
+        migrated += len(rows)
+
+
+def migrate_blacklist_copies():
+    """
+    Move full-copy blacklist images (static/blacklist/<name>.jpg) into the content-addressed
+    store and rewrite Blacklist.image_path. Needs an app context. Returns the number of rows migrated.
+    """
+    entries = Blacklist.query.filter(
+        Blacklist.image_path.like(f"{BLACKLIST_ROOT}/%"),
+        ~Blacklist.image_path.like(f"{BLACKLIST_ROOT}/%/%"),
+    ).all()
+    stored = {}  # Several entries may share one copied file
+    migrated = 0
+    for entry in entries:
+        old_path = entry.image_path
+        if old_path not in stored:
+            if not os.path.exists(old_path):
+                continue
+            stored[old_path] = store_blacklist_image(old_path, remove_source=True)
+            if os.path.exists(thumbnail_path(old_path)):
+                os.remove(thumbnail_path(old_path))
+        entry.image_path = stored[old_path]
+        migrated += 1
+    db.session.commit()
+    return migrated
@@ -0,0 +1,294 @@
+import datetime
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import cv2
+
+from metrics import DB_WRITE_SECONDS, ENCODE_SECONDS
+from models_tools import db, Snapshot
+from retention import unlink_snapshot_files
+from snapshot_rollup import record_inserted
+from snapshot_store import snapshot_path
+from sqlite_tuning import serialized_write
+from thumbnails import image_files_size, write_thumbnail
+
+
+class SnapshotJob:
+    __slots__ = ('image_path', 'frame', 'row', 'enqueued_at')
+
+    def __init__(self, image_path, frame, row):
+        self.image_path = image_path
+        self.frame = frame
+        self.row = row  # Column values for a new Snapshot, or None to only (re)write the image
+        self.enqueued_at = time.time()
+
+
+class SnapshotWriter:
+    """
+    Background writer that keeps JPEG encoding, disk writes and SQLite commits off the
+    camera processing thread.
+
+    New snapshots are queued in a bounded FIFO and written in batches: every image of
+    the batch is encoded and written together with its thumbnail, then all new rows
+    are inserted in one transaction. Rewrites of an existing image (a better view of a
+    tracked face) are coalesced by path, so only the latest frame for a path is ever
+    encoded.
+
+    When the queue holds `maxsize` new snapshots the `full_policy` applies:
+    'drop_newest' rejects the incoming snapshot, 'drop_oldest' evicts the oldest
+    queued one to make room. Dropped snapshots are counted in `stats()`.
+
+    A snapshot that never gets its row (evicted, or its write or commit failed) leaves
+    no files behind: whatever the batch wrote for it is unlinked, and since its path was
+    already handed out, later rewrites of that path are discarded.
+    """
+
+    def __init__(self, app, maxsize=64, batch_size=32, flush_interval=0.5, full_policy='drop_newest',
+                 jpeg_quality=90):
+        if full_policy not in ('drop_newest', 'drop_oldest'):
+            raise ValueError(f"Unknown full_policy: {full_policy}")
+        self.app = app
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.full_policy = full_policy
+        self.jpeg_quality = jpeg_quality
+
+        self.inserts = deque()
+        self.rewrites = OrderedDict()  # image_path -> SnapshotJob, latest frame wins
+        # Recent paths that never got a row; tracks drop within seconds, so a bounded window suffices
+        self.abandoned = OrderedDict()
+        self.max_abandoned = 16 * maxsize
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.listeners = []
+        self.resize_listeners = []
+
+        self.counters = {
+            'submitted': 0,
+            'written': 0,
+            'rewritten': 0,
+            'dropped': 0,
+            'dropped_rewrites': 0,
+            'coalesced': 0,
+            'errors': 0,
+            'batches': 0,
+        }
+        self.max_depth = 0
+        self.last_latency = 0.0
+        self.avg_latency = 0.0
+        self.last_encode_time = 0.0
+        self.last_commit_time = 0.0
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=10):
+        """Stop the worker after flushing whatever is still queued."""
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+            self.thread = None
+
+    def add_listener(self, listener):
+        """Register a callable that receives the list of committed row dicts (including id) after each batch."""
+        self.listeners.append(listener)
+
+    def add_resize_listener(self, listener):
+        """Register a callable that receives the net change in bytes of rewritten snapshots after each batch."""
+        self.resize_listeners.append(listener)
+
+    def submit(self, frame, camera_id=None, track_id=None):
+        """
+        Queue a new snapshot and return the image path it will be written to, or None
+        if the queue was full and the snapshot was dropped.
+        """
+        image_path = snapshot_path()
+        row = {
+            'image_path': image_path,
+            'camera_id': camera_id,
+            'track_id': track_id,
+            'timestamp': datetime.datetime.utcnow(),
+        }
+        with self.condition:
+            self.counters['submitted'] += 1
+            if len(self.inserts) >= self.maxsize:
+                self.counters['dropped'] += 1
+                if self.full_policy == 'drop_newest':
+                    return None
+                self._abandon(self.inserts.popleft().image_path)
+            self.inserts.append(SnapshotJob(image_path, frame, row))
+            self._track_depth()
+            self.condition.notify()
+        return image_path
+
+    def _abandon(self, image_path):
+        # Called with self.condition held
+        self.rewrites.pop(image_path, None)
+        self.abandoned[image_path] = True
+        if len(self.abandoned) > self.max_abandoned:
+            self.abandoned.popitem(last=False)
+
+    def submit_rewrite(self, image_path, frame):
+        """Queue a replacement image for an existing snapshot; pending rewrites of the same path coalesce."""
+        with self.condition:
+            if image_path in self.abandoned:
+                self.counters['dropped_rewrites'] += 1
+                return
+            if image_path in self.rewrites:
+                self.counters['coalesced'] += 1
+                del self.rewrites[image_path]
+            self.rewrites[image_path] = SnapshotJob(image_path, frame, None)
+            self._track_depth()
+            self.condition.notify()
+
+    def _track_depth(self):
+        self.max_depth = max(self.max_depth, len(self.inserts) + len(self.rewrites))
+
+    def _take_batch(self):
+        batch = []
+        while self.inserts and len(batch) < self.batch_size:
+            batch.append(self.inserts.popleft())
+        while self.rewrites and len(batch) < self.batch_size:
+            batch.append(self.rewrites.popitem(last=False)[1])
+        return batch
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.inserts and not self.rewrites:
+                    if self.stop_event.is_set():
+                        return
+                    self.condition.wait(self.flush_interval)
+                # Let a burst accumulate briefly so it lands in one transaction
+                if 0 < len(self.inserts) < self.batch_size and not self.stop_event.is_set():
+                    self.condition.wait(self.flush_interval)
+                batch = self._take_batch()
+            if batch:
+                self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        encode_start = time.time()
+        rows = []
+        resized = {}  # image_path -> (new size, old size) of rewritten snapshots
+        for job in batch:
+            if job.row is None:
+                with self.condition:
+                    if job.image_path in self.abandoned:
+                        # Its insert failed earlier in this batch
+                        self.counters['dropped_rewrites'] += 1
+                        continue
+            try:
+                old_size = image_files_size(job.image_path) if job.row is None else 0
+                job_start = time.perf_counter()
+                ok, buffer = cv2.imencode('.jpg', job.frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                if not ok:
+                    raise ValueError("JPEG encoding failed")
+                if job.row is not None:
+                    ENCODE_SECONDS.labels('snapshot', job.row['camera_id']).observe(time.perf_counter() - job_start)
+                else:
+                    ENCODE_SECONDS.labels('rewrite', None).observe(time.perf_counter() - job_start)
+                os.makedirs(os.path.dirname(job.image_path), exist_ok=True)
+                # Replace rather than overwrite: the old file may be hard-linked from the blacklist store
+                tmp = f"{job.image_path}.tmp"
+                with open(tmp, 'wb') as f:
+                    f.write(buffer.tobytes())
+                os.replace(tmp, job.image_path)
+                # The frame is already decoded here, so the thumbnail costs only a resize and a small encode
+                thumbnail = write_thumbnail(job.frame, job.image_path)
+                size = len(buffer) + os.path.getsize(thumbnail)
+            except Exception as e:
+                print(f"Error writing snapshot {job.image_path}: {e}")
+                self.counters['errors'] += 1
+                if job.row is not None:
+                    self._discard_files([job.image_path])
+                continue
+            if job.row is not None:
+                job.row['size_bytes'] = size
+                rows.append(job.row)
+            else:
+                resized[job.image_path] = (size, old_size)
+                self.counters['rewritten'] += 1
+        self.last_encode_time = time.time() - encode_start
+
+        commit_start = time.time()
+        if rows or resized:
+            with self.app.app_context(), serialized_write():
+                try:
+                    snapshots = [Snapshot(**row) for row in rows]
+                    db.session.add_all(snapshots)
+                    # The hourly rollup is updated in the same transaction, so it never drifts
+                    record_inserted(db.session, rows)
+                    db.session.flush()
+                    # Read ids before the commit expires the objects
+                    for row, snapshot in zip(rows, snapshots):
+                        row['id'] = snapshot.id
+                    for image_path, (size, _) in resized.items():
+                        Snapshot.query.filter_by(image_path=image_path).update(
+                            {Snapshot.size_bytes: size}, synchronize_session=False)
+                    db.session.commit()
+                    self.counters['written'] += len(rows)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Error committing {len(rows)} snapshots: {e}")
+                    self.counters['errors'] += len(rows)
+                    # Rewritten images of committed snapshots stay; the new ones have no row
+                    self._discard_files([row['image_path'] for row in rows])
+                    for row in rows:
+                        resized.pop(row['image_path'], None)
+                    rows = []
+            DB_WRITE_SECONDS.observe(time.time() - commit_start)
+            if rows:
+                for listener in self.listeners:
+                    try:
+                        listener(rows)
+                    except Exception as e:
+                        print(f"Error in snapshot writer listener: {e}")
+            delta = sum(size - old_size for size, old_size in resized.values())
+            for listener in self.resize_listeners:
+                try:
+                    listener(delta)
+                except Exception as e:
+                    print(f"Error in snapshot writer listener: {e}")
+        self.last_commit_time = time.time() - commit_start
+        self.counters['batches'] += 1
+
+        done = time.time()
+        self.last_latency = max(done - job.enqueued_at for job in batch)
+        self.avg_latency = 0.9 * self.avg_latency + 0.1 * self.last_latency if self.avg_latency else self.last_latency
+
+    def _discard_files(self, image_paths):
+        """Remove the files of snapshots that will never get a row and refuse later rewrites of them."""
+        with self.condition:
+            for image_path in image_paths:
+                self._abandon(image_path)
+        for image_path in image_paths:
+            unlink_snapshot_files(image_path)
+            try:
+                os.remove(f"{image_path}.tmp")
+            except OSError:
+                pass
+
+    def stats(self):
+        with self.condition:
+            depth = len(self.inserts) + len(self.rewrites)
+        return dict(
+            self.counters,
+            queue_depth=depth,
+            max_queue_depth=self.max_depth,
+            maxsize=self.maxsize,
+            full_policy=self.full_policy,
+            last_write_latency=self.last_latency,
+            avg_write_latency=self.avg_latency,
+            last_encode_time=self.last_encode_time,
+            last_commit_time=self.last_commit_time,
+        )
@@ -0,0 +1,55 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# Applied to every new pooled connection
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',  # Readers never block on the writer, and the writer never blocks readers
+    'synchronous': 'NORMAL',  # With WAL: fsync at checkpoints, not on every commit
+    'busy_timeout': 5000,  # Milliseconds to wait for another process's write lock before failing
+    'temp_store': 'MEMORY',
+    'cache_size': -16000,  # KiB per connection
+}
+
+# One writer at a time inside this process. SQLite allows a single writer anyway; queueing
+# here instead of in SQLite's busy handler means a deferred transaction can never fail to
+# upgrade to a write lock that another of our threads holds.
+write_lock = threading.RLock()
+_write_stats = {'writes': 0, 'wait_total': 0.0, 'wait_max': 0.0}
+
+
+def configure_sqlite(engine, pragmas=None):
+    """Apply `pragmas` (DEFAULT_PRAGMAS if None) to every connection `engine` opens."""
+    pragmas = DEFAULT_PRAGMAS if pragmas is None else pragmas
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    # Connections opened before the listener was registered are recycled
+    engine.dispose()
+
+
+@contextmanager
+def serialized_write():
+    """Hold the process-wide write lock around a write transaction (add/update/delete ... commit)."""
+    start = time.perf_counter()
+    with write_lock:
+        waited = time.perf_counter() - start
+        _write_stats['writes'] += 1
+        _write_stats['wait_total'] += waited
+        _write_stats['wait_max'] = max(_write_stats['wait_max'], waited)
+        yield
+
+
+def write_stats():
+    stats = dict(_write_stats)
+    stats['wait_avg'] = stats['wait_total'] / stats['writes'] if stats['writes'] else 0.0
+    return stats
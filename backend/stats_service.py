@@ -0,0 +1,91 @@
+import threading
+
+from models_tools import Snapshot, Blacklist
+
+
+class StatsService:
+    """
+    In-memory dashboard aggregates: snapshot count, blacklist size and the latest snapshot.
+
+    Seeded from the database once at startup, then kept current by the code paths that
+    insert or delete rows, so /api/dashboard never runs COUNT queries. Listeners are
+    notified of changes at most once per `push_interval` seconds, with the latest values.
+    """
+
+    def __init__(self, push_interval=1.0):
+        self.push_interval = push_interval
+        self.total_snapshots = 0
+        self.blacklist_size = 0
+        self.last_snapshot_time = None
+        self.last_snapshot_image = None
+        self.listeners = []
+        self.push_timer = None
+        self.lock = threading.Lock()
+
+    def seed(self):
+        """Load the aggregates from the database. Needs an app context."""
+        last_snapshot = Snapshot.query.order_by(Snapshot.timestamp.desc()).first()
+        with self.lock:
+            self.total_snapshots = Snapshot.query.count()
+            self.blacklist_size = Blacklist.query.count()
+            self.last_snapshot_time = last_snapshot.timestamp if last_snapshot else None
+            self.last_snapshot_image = last_snapshot.image_path if last_snapshot else None
+
+    def snapshots_added(self, rows):
+        """Account for committed snapshot rows (dicts with image_path and timestamp)."""
+        if not rows:
+            return
+        newest = max(rows, key=lambda row: row['timestamp'])
+        with self.lock:
+            self.total_snapshots += len(rows)
+            if self.last_snapshot_time is None or newest['timestamp'] >= self.last_snapshot_time:
+                self.last_snapshot_time = newest['timestamp']
+                self.last_snapshot_image = newest['image_path']
+        self._changed()
+
+    def snapshots_deleted(self, count):
+        if not count:
+            return
+        with self.lock:
+            self.total_snapshots = max(0, self.total_snapshots - count)
+            if self.total_snapshots == 0:
+                self.last_snapshot_time = self.last_snapshot_image = None
+        self._changed()
+
+    def blacklist_changed(self, delta):
+        with self.lock:
+            self.blacklist_size = max(0, self.blacklist_size + delta)
+        self._changed()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'last_snapshot_time': self.last_snapshot_time.strftime('%Y-%m-%d %H:%M:%S')
+                if self.last_snapshot_time else None,
+                'last_snapshot_image': self.last_snapshot_image,
+                'blacklist_size': self.blacklist_size,
+                'total_snapshots': self.total_snapshots,
+            }
+
+    def add_listener(self, listener):
+        """Register a callable that receives snapshot() whenever the aggregates change."""
+        self.listeners.append(listener)
+
+    def _changed(self):
+        # Coalesce bursts: one push per interval carrying the latest values
+        with self.lock:
+            if self.push_timer is not None or not self.listeners:
+                return
+            self.push_timer = threading.Timer(self.push_interval, self._push)
+            self.push_timer.daemon = True
+            self.push_timer.start()
+
+    def _push(self):
+        with self.lock:
+            self.push_timer = None
+        data = self.snapshot()
+        for listener in self.listeners:
+            try:
+                listener(data)
+            except Exception as e:
+                print(f"Error pushing dashboard stats: {e}")
@@ -0,0 +1,201 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from metrics import ENCODE_SECONDS
+
+
+class StreamBroadcaster:
+    """
+    Encodes one camera's frames once and fans the same JPEG bytes out to every MJPEG client.
+
+    The encoder thread only runs while at least one client is subscribed. It takes the
+    newest frame from the camera at most `fps` times per second, downscales it to
+    `max_width`, optionally draws the latest detections, and publishes a single
+    latest-JPEG slot. Clients always read the newest slot, so a slow client skips
+    frames instead of queueing them. While no new frame arrives, each client is re-sent
+    the last one (or a blank placeholder) every `keepalive` seconds, which is how a
+    closed connection is noticed and its subscription released. `on_idle` is called with the broadcaster once its
+    encoder has stopped for lack of clients.
+    """
+
+    def __init__(self, camera_manager, camera_id=None, fps=10, jpeg_quality=70, max_width=960,
+                 overlays=False, overlay_ttl=1.0, idle_timeout=5.0, keepalive=5.0, on_idle=None):
+        self.camera_manager = camera_manager
+        self.camera_id = camera_id
+        self.fps = fps
+        self.jpeg_quality = jpeg_quality
+        self.max_width = max_width
+        self.overlays = overlays
+        self.overlay_ttl = overlay_ttl
+        self.idle_timeout = idle_timeout
+        self.keepalive = keepalive
+        self.on_idle = on_idle
+
+        self.condition = threading.Condition()
+        self.jpeg = None
+        self.seq = 0
+        self.subscribers = 0
+        self.thread = None
+        self.detections = None  # (boxes, scores, timestamp) in original frame coordinates
+        self.encoded = 0
+
+    def set_detections(self, boxes, scores, timestamp=None):
+        self.detections = (boxes, scores, time.time() if timestamp is None else timestamp)
+
+    def _ensure_running(self):
+        # Called with self.condition held
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def _run(self):
+        interval = 1.0 / self.fps
+        camera, camera_seq = None, 0
+        idle_since = None
+        encode_seconds = ENCODE_SECONDS.labels('stream', self.camera_id or 'default')
+        while True:
+            with self.condition:
+                if self.subscribers == 0:
+                    idle_since = idle_since or time.time()
+                    if time.time() - idle_since >= self.idle_timeout:
+                        self.thread = None
+                        break
+                else:
+                    idle_since = None
+
+            tick_start = time.time()
+            current = self.camera_manager.get(self.camera_id)
+            if current is None:
+                time.sleep(1)
+                continue
+            if current is not camera:
+                # Sequence numbers restart when the camera is replaced from the settings route
+                camera, camera_seq = current, 0
+
+            frame, seq, _ = camera.get_latest_frame(camera_seq, timeout=1.0)
+            if frame is None or seq == camera_seq:
+                continue
+            camera_seq = seq
+
+            encode_start = time.perf_counter()
+            jpeg = self._encode(frame)
+            encode_seconds.observe(time.perf_counter() - encode_start)
+            if jpeg is not None:
+                with self.condition:
+                    self.jpeg = jpeg
+                    self.seq += 1
+                    self.encoded += 1
+                    self.condition.notify_all()
+
+            # Pace the encoder to the configured frame rate
+            time.sleep(max(0.0, interval - (time.time() - tick_start)))
+
+        if self.on_idle is not None:
+            self.on_idle(self)
+
+    def _encode(self, frame):
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.max_width / width) if self.max_width else 1.0
+        if scale < 1.0:
+            frame = cv2.resize(frame, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        elif self.overlays:
+            frame = frame.copy()  # The camera slot is shared and must not be drawn on
+
+        if self.overlays and self.detections is not None:
+            boxes, scores, timestamp = self.detections
+            if time.time() - timestamp <= self.overlay_ttl:
+                for (x1, y1, x2, y2), score in zip(boxes, scores):
+                    p1, p2 = (int(x1 * scale), int(y1 * scale)), (int(x2 * scale), int(y2 * scale))
+                    cv2.rectangle(frame, p1, p2, (0, 255, 0), 2)
+                    cv2.putText(frame, f"{score:.2f}", (p1[0], p1[1] - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5,
+                                (0, 255, 0), 1)
+
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        return buffer.tobytes() if ok else None
+
+    def subscribe(self):
+        """Generator of multipart MJPEG chunks for one client."""
+        with self.condition:
+            self.subscribers += 1
+            self._ensure_running()
+        try:
+            last_seq = 0
+            while True:
+                with self.condition:
+                    self.condition.wait_for(lambda: self.seq > last_seq, timeout=self.keepalive)
+                    # Always jump to the newest frame; anything missed in between is skipped.
+                    # Without one, repeat the last: writing is what detects a closed client
+                    jpeg, last_seq = self.jpeg, self.seq
+                if jpeg is None:
+                    jpeg = _placeholder_jpeg()
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+        finally:
+            with self.condition:
+                self.subscribers -= 1
+
+    def stats(self):
+        with self.condition:
+            return {'subscribers': self.subscribers, 'encoded_frames': self.encoded,
+                    'running': self.thread is not None}
+
+
+_placeholder = None
+
+
+def _placeholder_jpeg():
+    """Blank frame sent to clients of a camera that has not delivered one yet."""
+    global _placeholder
+    if _placeholder is None:
+        _, buffer = cv2.imencode('.jpg', np.zeros((180, 320, 3), dtype=np.uint8))
+        _placeholder = buffer.tobytes()
+    return _placeholder
+
+
+class StreamHub:
+    """
+    One StreamBroadcaster per (camera, overlays) pair, created on first use for a
+    configured camera and dropped again when its encoder stops for lack of clients.
+    """
+
+    def __init__(self, camera_manager, **options):
+        self.camera_manager = camera_manager
+        self.options = options
+        self.broadcasters = {}
+        self.lock = threading.Lock()
+
+    def get(self, camera_id=None, overlays=None):
+        """Broadcaster of a camera (default: the first one), or None for an unknown camera id."""
+        if camera_id is not None and camera_id not in self.camera_manager.camera_ids():
+            return None
+        overlays = self.options.get('overlays', False) if overlays is None else overlays
+        key = (camera_id, overlays)
+        with self.lock:
+            if key not in self.broadcasters:
+                options = dict(self.options, overlays=overlays,
+                               on_idle=lambda broadcaster: self._discard(key, broadcaster))
+                self.broadcasters[key] = StreamBroadcaster(self.camera_manager, camera_id, **options)
+            return self.broadcasters[key]
+
+    def _discard(self, key, broadcaster):
+        with self.lock:
+            # A client may have subscribed while the encoder was stopping; keep it then
+            if self.broadcasters.get(key) is broadcaster and not broadcaster.stats()['subscribers']:
+                del self.broadcasters[key]
+
+    def set_detections(self, camera_id, boxes, scores, timestamp=None):
+        """Hand the latest detections of a camera to its overlay broadcasters."""
+        default_id = next(iter(self.camera_manager.camera_ids()), None)
+        with self.lock:
+            broadcasters = list(self.broadcasters.items())
+        for (key_camera_id, overlays), broadcaster in broadcasters:
+            if overlays and (key_camera_id or default_id) == camera_id:
+                broadcaster.set_detections(boxes, scores, timestamp)
+
+    def stats(self):
+        with self.lock:
+            return {f"{camera_id or 'default'}{'+overlays' if overlays else ''}": b.stats()
+                    for (camera_id, overlays), b in self.broadcasters.items()}
@@ -0,0 +1,169 @@
+"""EmailOutbox against an in-process stand-in SMTP server (aiosmtpd)."""
+import datetime
+import email
+import socket
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+aiosmtpd_controller = pytest.importorskip('aiosmtpd.controller')
+
+from flask import Flask
+
+from email_outbox import EmailOutbox
+from models_tools import db, EmailOutbox as OutboxMessage
+
+
+class RecordingHandler:
+    """Keeps every received message and counts SMTP sessions (one EHLO per connection)."""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(email.message_from_bytes(envelope.content))
+        return '250 OK'
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler()
+    controller = aiosmtpd_controller.Controller(handler, hostname='127.0.0.1', port=free_port())
+    controller.start()
+    yield handler, controller.port
+    controller.stop()
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__, root_path=str(tmp_path))
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'test.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+def smtp_settings(port):
+    return {'smtp_server': '127.0.0.1', 'smtp_port': port, 'smtp_starttls': 'false'}
+
+
+def test_reuses_one_connection_across_messages(app, smtp_server):
+    handler, port = smtp_server
+    outbox = EmailOutbox(app, settings=lambda: smtp_settings(port))
+    for i in range(3):
+        outbox.enqueue('ops@example.com', f"Subject {i}", f"Body {i}")
+    assert outbox.drain() == 3
+
+    outbox.enqueue('ops@example.com', "Subject 3", "Body 3")
+    assert outbox.drain() == 1
+    outbox.session.close()
+
+    assert [m['Subject'] for m in handler.messages] == ['Subject 0', 'Subject 1', 'Subject 2', 'Subject 3']
+    assert outbox.stats()['smtp_connects'] == 1
+    assert handler.sessions == 1
+    assert outbox.stats()['pending'] == 0
+
+
+def test_coalesces_alerts_with_a_digest_key(app, smtp_server):
+    handler, port = smtp_server
+    outbox = EmailOutbox(app, settings=lambda: smtp_settings(port), digest_window=0.2)
+    for i in range(3):
+        outbox.enqueue('ops@example.com', "Blacklist match", f"Match {i}", digest_key='blacklist_alert')
+    outbox.enqueue('other@example.com', "Blacklist match", "Match for another recipient",
+                   digest_key='blacklist_alert')
+
+    # Held for the digest window
+    assert outbox.drain() == 0
+    time.sleep(0.3)
+    assert outbox.drain() == 2
+    outbox.session.close()
+
+    by_recipient = {m['To']: m for m in handler.messages}
+    digest = by_recipient['ops@example.com']
+    assert digest['Subject'] == "Blacklist match (3 alerts)"
+    body = digest.get_payload()[0].get_payload()
+    assert all(f"Match {i}" in body for i in range(3))
+    assert by_recipient['other@example.com']['Subject'] == "Blacklist match"
+    assert outbox.stats()['sent_messages'] == 4
+
+
+def test_failed_sends_back_off_exponentially(app):
+    port = free_port()  # Nothing listens here
+    outbox = EmailOutbox(app, settings=lambda: smtp_settings(port), retry_delay=30, max_attempts=2)
+    message_id = outbox.enqueue('ops@example.com', "Subject", "Body")
+
+    before = datetime.datetime.utcnow()
+    assert outbox.drain() == 0
+    with app.app_context():
+        message = db.session.get(OutboxMessage, message_id)
+        assert message.status == 'pending' and message.attempts == 1
+        assert message.not_before >= before + datetime.timedelta(seconds=29)
+
+        # Not due yet: a second drain does not retry it
+        assert outbox.drain() == 0
+        assert db.session.get(OutboxMessage, message_id).attempts == 1
+
+        # Due again: the second failure uses twice the delay, and max_attempts ends it
+        message.not_before = before
+        db.session.commit()
+    assert outbox.drain() == 0
+    with app.app_context():
+        message = db.session.get(OutboxMessage, message_id)
+        assert message.attempts == 2 and message.status == 'failed'
+    assert outbox.stats()['retries'] == 1 and outbox.stats()['failed'] == 1
+
+
+def test_attachments_resolve_against_the_app_root(app, smtp_server, tmp_path):
+    handler, port = smtp_server
+    (tmp_path / 'static').mkdir()
+    cv2.imwrite(str(tmp_path / 'static' / 'face.jpg'), np.full((40, 2000, 3), 128, dtype=np.uint8))
+    outbox = EmailOutbox(app, settings=lambda: smtp_settings(port), attachment_max_width=640)
+    outbox.enqueue('ops@example.com', "Snapshot", "See attached",
+                   attachments=['static/face.jpg', 'static/deleted.jpg'])
+    assert outbox.drain() == 1
+    outbox.session.close()
+
+    body, *images = handler.messages[0].get_payload()
+    assert [image.get_filename() for image in images] == ['face.jpg']
+    attached = cv2.imdecode(np.frombuffer(images[0].get_payload(decode=True), np.uint8), cv2.IMREAD_COLOR)
+    assert attached.shape[1] == 640
+    assert 'deleted.jpg' in body.get_payload()
+    assert outbox.stats()['missing_attachments'] == 1
+
+
+def test_purges_sent_rows_after_the_retention_window(app, smtp_server):
+    handler, port = smtp_server
+    outbox = EmailOutbox(app, settings=lambda: smtp_settings(port), sent_retention=3600)
+    old_id = outbox.enqueue('ops@example.com', "Old", "Body")
+    new_id = outbox.enqueue('ops@example.com', "New", "Body")
+    assert outbox.stats()['pending'] == 2
+    assert outbox.drain() == 2
+    outbox.session.close()
+    assert outbox.stats()['pending'] == 0
+
+    with app.app_context():
+        db.session.get(OutboxMessage, old_id).sent_at -= datetime.timedelta(hours=2)
+        db.session.commit()
+    outbox.maintain()
+    with app.app_context():
+        assert db.session.get(OutboxMessage, old_id) is None
+        assert db.session.get(OutboxMessage, new_id) is not None
+    assert outbox.stats()['purged'] == 1
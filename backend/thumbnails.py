@@ -0,0 +1,80 @@
+import os
+
+import cv2
+
+THUMBNAIL_DIR = 'static/thumbnails'
+THUMBNAIL_WIDTH = 320
+THUMBNAIL_QUALITY = 75
+
+
+def thumbnail_path(image_path):
+    """Side-directory path of an image's thumbnail: static/snapshots/x.jpg -> static/thumbnails/snapshots/x.jpg."""
+    relative = os.path.relpath(os.path.normpath(image_path), 'static')
+    return os.path.join(THUMBNAIL_DIR, relative).replace(os.sep, '/')
+
+
+def thumbnail_url(image_path):
+    """
+    URL path of an image's thumbnail, versioned by the image's modification time so
+    the response can be cached as immutable and still change when the image is rewritten.
+    """
+    try:
+        version = os.stat(image_path).st_mtime_ns // 1000000
+    except OSError:
+        version = 0
+    return f"api/thumbnails/{image_path}?v={version}"
+
+
+def image_files_size(image_path):
+    """Bytes on disk of an image and its thumbnail; missing files count as 0."""
+    size = 0
+    for path in (image_path, thumbnail_path(image_path)):
+        try:
+            size += os.stat(path).st_size
+        except OSError:
+            pass
+    return size
+
+
+def write_thumbnail(frame, image_path, width=THUMBNAIL_WIDTH, quality=THUMBNAIL_QUALITY):
+    """Downscale an already-decoded BGR frame and write it as the thumbnail of `image_path`."""
+    path = thumbnail_path(image_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    height0, width0 = frame.shape[:2]
+    if width0 > width:
+        frame = cv2.resize(frame, (width, int(round(height0 * width / width0))), interpolation=cv2.INTER_AREA)
+    ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError(f"Thumbnail encoding failed for {image_path}")
+    # Write to a temporary name first so concurrent readers never see a partial file
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(buffer.tobytes())
+    os.replace(tmp, path)
+    return path
+
+
+def ensure_thumbnail(image_path):
+    """
+    Return the thumbnail path for `image_path`, creating it from the full image if it is
+    missing or older than the image (lazy path for snapshots written before thumbnails).
+    Returns None if the image does not exist.
+    """
+    path = thumbnail_path(image_path)
+    try:
+        image_mtime = os.stat(image_path).st_mtime
+    except OSError:
+        return None
+    try:
+        if os.stat(path).st_mtime >= image_mtime:
+            return path
+    except OSError:
+        pass
+
+    # IMREAD_REDUCED_COLOR_4 lets the JPEG decoder skip most of the full-resolution work
+    frame = cv2.imread(image_path, cv2.IMREAD_REDUCED_COLOR_4)
+    if frame is None or frame.shape[1] < THUMBNAIL_WIDTH:
+        frame = cv2.imread(image_path)
+    if frame is None:
+        return None
+    return write_thumbnail(frame, image_path)
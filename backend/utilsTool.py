@@ -2,93 +2,65 @@
 
 import face_recognition
 import cv2
-import os
-from models_tools import Snapshot, Blacklist, db
-from datetime import datetime, timedelta
-from flask import current_app
-import smtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.image import MIMEImage
-import threading
-import time
+import numpy as np
 
-def extract_faces(frame):
+def extract_faces(frame, boxes=None, padding=0.0):
+    """
+    Face locations in face_recognition's (top, right, bottom, left) order.
+
+    When YOLO boxes are given they are converted directly and no second detector runs;
+    otherwise the whole frame goes through face_recognition's HOG detector.
+    """
+    if boxes is not None:
+        return boxes_to_locations(boxes, frame.shape, padding)
     rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
     face_locations = face_recognition.face_locations(rgb_frame)
     return face_locations
 
+def boxes_to_locations(boxes, frame_shape, padding=0.0):
+    """Convert xyxy boxes to clipped (top, right, bottom, left) tuples, optionally padded by a fraction of the box size."""
+    height, width = frame_shape[:2]
+    locations = []
+    for x1, y1, x2, y2 in boxes:
+        pad_x, pad_y = (x2 - x1) * padding, (y2 - y1) * padding
+        locations.append((
+            max(0, int(y1 - pad_y)),
+            min(width, int(x2 + pad_x)),
+            min(height, int(y2 + pad_y)),
+            max(0, int(x1 - pad_x)),
+        ))
+    return locations
+
+def encode_faces(frame, boxes, padding=0.0):
+    """
+    Compute float32 face embeddings for every YOLO box of a BGR frame in one call.
+    Returns one embedding per box, in order.
+    """
+    if len(boxes) == 0:
+        return []
+    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    locations = boxes_to_locations(boxes, frame.shape, padding)
+    encodings = face_recognition.face_encodings(rgb_frame, known_face_locations=locations)
+    return [np.asarray(encoding, dtype=np.float32) for encoding in encodings]
+
 def compare_faces(known_encodings, face_encoding, threshold):
     results = face_recognition.compare_faces(known_encodings, face_encoding, tolerance=threshold)
     return results
 
-def save_snapshot(face_image):
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-    filename = f'static/snapshots/{timestamp}.jpg'
-    cv2.imwrite(filename, face_image)
-    snapshot = Snapshot(image_path=filename, timestamp=datetime.now())
-    db.session.add(snapshot)
-    db.session.commit()
-    return snapshot
-
-def send_email_notification(image_path, recipient_email, smtp_settings):
-    msg = MIMEMultipart()
-    msg['Subject'] = 'Blacklisted Face Detected'
-    msg['From'] = smtp_settings['username']
-    msg['To'] = recipient_email
-
-    with open(image_path, 'rb') as fp:
-        img = MIMEImage(fp.read())
-        img.add_header('Content-Disposition', 'attachment', filename=os.path.basename(image_path))
-        msg.attach(img)
-
-    with smtplib.SMTP(smtp_settings['server'], smtp_settings['port']) as server:
-        server.starttls()
-        server.login(smtp_settings['username'], smtp_settings['password'])
-        server.sendmail(msg['From'], [msg['To']], msg.as_string())
-
-def cleanup_old_snapshots(retention_days):
-    cutoff = datetime.now() - timedelta(days=retention_days)
-    old_snapshots = Snapshot.query.filter(Snapshot.timestamp < cutoff).all()
-    for snapshot in old_snapshots:
-        try:
-            if os.path.exists(snapshot.image_path):
-                os.remove(snapshot.image_path)
-        except Exception as e:
-            current_app.logger.error(f"Error deleting snapshot file {snapshot.image_path}: {e}")
-        db.session.delete(snapshot)
-    db.session.commit()
-
-def start_cleanup_thread(retention_days):
-    def cleanup_thread(snapshot_retention_days):
-        """
-        Background thread to clean up old snapshots periodically.
-        """
-        import time
-        from datetime import datetime, timedelta
-        import os
-
-        while True:
-            try:
-                # Explicitly push an app context
-                with current_app.app_context():
-                    from models import Snapshot, db
-                    
-                    # Calculate the cutoff time for deletion
-                    cutoff_time = datetime.utcnow() - timedelta(days=snapshot_retention_days)
-                    old_snapshots = Snapshot.query.filter(Snapshot.timestamp < cutoff_time).all()
-
-                    for snapshot in old_snapshots:
-                        # Delete the file from the file system
-                        if os.path.exists(snapshot.image_path):
-                            os.remove(snapshot.image_path)
-                        
-                        # Remove the snapshot entry from the database
-                        db.session.delete(snapshot)
-                    
-                    db.session.commit()
-                    print(f"Cleaned up {len(old_snapshots)} old snapshots.")
-            except Exception as e:
-                print(f"Error in cleanup thread: {e}")
-            
-            # Sleep for a defined interval (e.g., 1 hour)
-            time.sleep(3600)
+def encode_face_image(image):
+    """
+    Compute the 128-d face embedding of the largest face in a BGR image or image file.
+    Returns a float32 array, or None if no face is found.
+    """
+    if isinstance(image, str):
+        image = cv2.imread(image)
+        if image is None:
+            return None
+    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    face_locations = face_recognition.face_locations(rgb_image)
+    if not face_locations:
+        return None
+    # (top, right, bottom, left): keep the largest face
+    largest = max(face_locations, key=lambda loc: (loc[2] - loc[0]) * (loc[1] - loc[3]))
+    encodings = face_recognition.face_encodings(rgb_image, known_face_locations=[largest])
+    return np.asarray(encodings[0], dtype=np.float32) if encodings else None
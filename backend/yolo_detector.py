@@ -4,6 +4,8 @@ import numpy as np
 from torchvision.ops import nms
 import time
 
+from metrics import BATCH_SIZE, INFERENCE_SECONDS, NMS_SECONDS, PREPROCESS_SECONDS
+
 def letterbox(img, new_shape=640, color=(114, 114, 114)):
     # Resize and pad image while keeping aspect ratio
     shape = img.shape[:2]  # current shape [height, width]
@@ -25,6 +27,35 @@ def letterbox(img, new_shape=640, color=(114, 114, 114)):
     img = cv2.copyMakeBorder(img, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
     return img, ratio, (dw, dh)
 
+def postprocess_predictions(output_tensor, ratio, pad, conf_threshold, nms_threshold):
+    """
+    Filter, rescale and suppress the raw predictions of a single image.
+
+    `output_tensor` has shape [5, N] (xywh + confidence per anchor). Everything runs as
+    tensor operations on the tensor's own device; only the surviving boxes are copied
+    back to Python lists.
+    """
+    # Transpose to get predictions in [N, 5] and drop low-confidence anchors in one pass
+    preds = output_tensor.T
+    preds = preds[preds[:, 4] > conf_threshold].float()
+    if preds.shape[0] == 0:
+        return [], []
+
+    # xywh -> xyxy
+    xy, wh = preds[:, :2], preds[:, 2:4]
+    boxes = torch.cat((xy - wh / 2, xy + wh / 2), dim=1)
+
+    # Undo the letterbox and scaling
+    dw, dh = pad
+    boxes -= torch.tensor([dw, dh, dw, dh], dtype=boxes.dtype, device=boxes.device)
+    boxes /= torch.tensor([ratio[0], ratio[1], ratio[0], ratio[1]], dtype=boxes.dtype, device=boxes.device)
+
+    # Perform Non-Max Suppression (NMS)
+    scores = preds[:, 4]
+    indices = nms(boxes, scores, nms_threshold)
+    return boxes[indices].tolist(), scores[indices].tolist()
+
+
 class YOLOv9FaceDetector:
     def __init__(self, weights_path, device="cpu", conf_threshold=0.5, nms_threshold=0.4, face_class_id=0, input_size=640):
         self.device = torch.device(device if torch.cuda.is_available() else "cpu")
@@ -56,14 +87,8 @@ class YOLOv9FaceDetector:
         print(f"Model warm-up completed in {elapsed_time:.4f} seconds.")
 
 
-    def detect_faces(self, frame):
-        start_time = time.time()
-        if frame is None or not isinstance(frame, np.ndarray):
-            raise ValueError("Invalid frame: Ensure the input is a valid NumPy array.")
-
-        # Preprocess frame
-        preprocess_start = time.time()
-        height0, width0 = frame.shape[:2]  # Original image dimensions
+    def preprocess(self, frame):
+        """Letterbox a BGR frame and convert it to a normalized [C, H, W] tensor on the model device."""
         img, ratio, (dw, dh) = letterbox(frame, self.input_size)
         # Convert to RGB
         img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
@@ -74,73 +99,95 @@ class YOLOv9FaceDetector:
 
         if self.device.type == 'cuda':
             img = img.half()  # Convert to half precision if model is half
+        return img, ratio, (dw, dh)
 
+    def _synchronize(self):
+        # CUDA kernels run asynchronously; wait for them so the forward pass is timed, not queued
+        if self.device.type == 'cuda':
+            torch.cuda.synchronize()
+
+    def detect_faces(self, frame):
+        start_time = time.perf_counter()
+        if frame is None or not isinstance(frame, np.ndarray):
+            raise ValueError("Invalid frame: Ensure the input is a valid NumPy array.")
+
+        # Preprocess frame
+        img, ratio, (dw, dh) = self.preprocess(frame)
         img = img.unsqueeze(0)  # Add batch dimension
-        preprocess_end = time.time()
-        preprocess_time = preprocess_end - preprocess_start
+        preprocess_end = time.perf_counter()
 
         # Run model inference
-        inference_start = time.time()
         with torch.no_grad():
             predictions = self.model(img)
-        inference_end = time.time()
-        inference_time = inference_end - inference_start
+        self._synchronize()
+        inference_end = time.perf_counter()
 
         # Post-processing
-        postprocess_start = time.time()
         # Extract the output tensor from predictions
         output_tensor = predictions[0][0]  # Adjust based on your model's output structure
 
         # Remove batch dimension
         output_tensor = output_tensor.squeeze(0)  # Shape: [5, N]
 
-        # Transpose to get predictions in [N, 5]
-        output_tensor = output_tensor.T  # Shape: [N, 5]
-
-        boxes = []
-        confidences = []
-
-        for pred in output_tensor:
-            x_center, y_center, width_box, height_box, confidence = pred[:5]
-            if confidence > self.conf_threshold:
-                x1 = x_center - width_box / 2
-                y1 = y_center - height_box / 2
-                x2 = x_center + width_box / 2
-                y2 = y_center + height_box / 2
-
-                # Undo the letterbox and scaling
-                x1 = (x1 - dw) / ratio[0]
-                y1 = (y1 - dh) / ratio[1]
-                x2 = (x2 - dw) / ratio[0]
-                y2 = (y2 - dh) / ratio[1]
-
-                boxes.append([x1.item(), y1.item(), x2.item(), y2.item()])
-                confidences.append(confidence.item())
-
-        # Perform Non-Max Suppression (NMS)
-        if len(boxes) > 0:
-            boxes = torch.tensor(boxes, dtype=torch.float32)
-            confidences = torch.tensor(confidences, dtype=torch.float32)
-            indices = nms(boxes, confidences, self.nms_threshold)
-            boxes = boxes[indices].tolist()
-            confidences = confidences[indices].tolist()
-        else:
-            print("No detections above confidence threshold.")
-
-        postprocess_end = time.time()
-        postprocess_time = postprocess_end - postprocess_start
-
-        total_time = time.time() - start_time
-
-        fps = 1 / total_time
-        print(f"Preprocessing time: {preprocess_time:.4f}s")
-        print(f"Inference time: {inference_time:.4f}s")
-        print(f"Post-processing time: {postprocess_time:.4f}s")
-        print(f"Total detection time: {total_time:.4f}s")
-        print(f"Calculated FPS: {fps:.2f}")
+        boxes, confidences = postprocess_predictions(
+            output_tensor, ratio, (dw, dh), self.conf_threshold, self.nms_threshold
+        )
+        postprocess_end = time.perf_counter()
+
+        BATCH_SIZE.observe(1)
+        PREPROCESS_SECONDS.observe(preprocess_end - start_time)
+        INFERENCE_SECONDS.observe(inference_end - preprocess_end)
+        NMS_SECONDS.observe(postprocess_end - inference_end)
 
+        fps = 1 / (postprocess_end - start_time)
         return boxes, confidences, fps
 
+    def detect_faces_batch(self, frames):
+        """
+        Detect faces in several frames with a single forward pass.
+
+        Frames may have different resolutions; each one is letterboxed to the same
+        square input and its boxes are mapped back to its own original size.
+        Returns a list of (boxes, confidences) tuples, one per input frame.
+        """
+        if not frames:
+            return []
+        for frame in frames:
+            if frame is None or not isinstance(frame, np.ndarray):
+                raise ValueError("Invalid frame: Ensure every input is a valid NumPy array.")
+
+        start_time = time.perf_counter()
+
+        # Preprocess frames into one [B, C, H, W] tensor
+        tensors, letterbox_params = [], []
+        for frame in frames:
+            img, ratio, pad = self.preprocess(frame)
+            tensors.append(img)
+            letterbox_params.append((ratio, pad))
+        batch = torch.stack(tensors)
+        preprocess_end = time.perf_counter()
+
+        # Run model inference
+        with torch.no_grad():
+            predictions = self.model(batch)
+        self._synchronize()
+        inference_end = time.perf_counter()
+
+        # Post-processing, per image of the batch
+        output_tensor = predictions[0][0]  # Shape: [B, 5, N]
+        results = [
+            postprocess_predictions(output, ratio, pad, self.conf_threshold, self.nms_threshold)
+            for output, (ratio, pad) in zip(output_tensor, letterbox_params)
+        ]
+        postprocess_end = time.perf_counter()
+
+        BATCH_SIZE.observe(len(frames))
+        PREPROCESS_SECONDS.observe(preprocess_end - start_time)
+        INFERENCE_SECONDS.observe(inference_end - preprocess_end)
+        NMS_SECONDS.observe(postprocess_end - inference_end)
+
+        return results
+
     def draw_bounding_boxes(self, frame, boxes, scores):
         # Make a copy of the frame to draw overlays
         frame_with_overlays = frame.copy()
@@ -37,10 +37,12 @@ const BlacklistItem = ({ entry, onImageClick }) => {
   };
 
   useEffect(() => {
-    if (entry.image_path) {
-      fetchImageForGrid(entry.image_path);
+    // The grid only needs the small cached thumbnail; the full image is loaded in fullscreen
+    const gridImagePath = entry.thumbnail_url || entry.image_path;
+    if (gridImagePath) {
+      fetchImageForGrid(gridImagePath);
     }
-  }, [entry.image_path]);
+  }, [entry.thumbnail_url, entry.image_path]);
 
   return (
     <div className="snapshot-item">
@@ -1,5 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer } from 'recharts';
+import { io } from 'socket.io-client';
 import FilterBar from './FilterBar'; // Import the reusable FilterBar component
 import './Dashboard.css';
 import Loader from './Loader'; // Ensure Loader.js is properly imported
@@ -112,6 +113,25 @@ function Dashboard() {
     fetchSnapshotStats(); // Fetch "All Time" data by default
   }, [baseUrl]);
 
+  // Counters are pushed by the backend when they change, so no polling is needed
+  useEffect(() => {
+    const socket = io(baseUrl, { extraHeaders: { 'Ngrok-Skip-Browser-Warning': 'true' } });
+    socket.on('connect', () => socket.emit('subscribe', { topics: ['dashboard_stats'] }));
+    socket.on('live_update', (update, ack) => {
+      // Acknowledge so the server sends the next bundle
+      if (ack) ack();
+      const stats = update.dashboard_stats;
+      if (!stats) return;
+      setData((previous) => {
+        if (previous && stats.last_snapshot_image && stats.last_snapshot_image !== previous.last_snapshot_image) {
+          fetchSnapshotImage(stats.last_snapshot_image);
+        }
+        return previous ? { ...previous, ...stats } : previous;
+      });
+    });
+    return () => socket.disconnect();
+  }, [baseUrl]);
+
   useEffect(() => {
     console.log('Fetching snapshot stats with updated dates:', { startDate, endDate });
     fetchSnapshotStats();
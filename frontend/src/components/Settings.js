@@ -88,6 +88,17 @@ const Settings = () => {
             </select>
           </div>
 
+          <div className="form-group">
+            <label htmlFor="alert_email">Alert Email Recipient:</label>
+            <input
+              type="email"
+              id="alert_email"
+              name="alert_email"
+              value={settings.alert_email || ''}
+              onChange={handleChange}
+            />
+          </div>
+
           <div className="form-group">
             <label htmlFor="snapshot_retention_days">Snapshot Retention Days:</label>
             <input
@@ -99,6 +110,17 @@ const Settings = () => {
             />
           </div>
 
+          <div className="form-group">
+            <label htmlFor="snapshot_max_gb">Snapshot Disk Quota (GB, 0 = unlimited):</label>
+            <input
+              type="number"
+              id="snapshot_max_gb"
+              name="snapshot_max_gb"
+              value={settings.snapshot_max_gb || ''}
+              onChange={handleChange}
+            />
+          </div>
+
           <div className="form-group">
             <label htmlFor="smtp_server">SMTP Server:</label>
             <input
@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback, memo } from 'react';
+import React, { useState, useEffect, useCallback, useRef, memo } from 'react';
 import {
   getPaginatedSnapshots,
   addToBlacklist,
@@ -7,6 +7,7 @@ import {
 } from '../services/api';
 import FilterBar from './FilterBar';
 import Loader from './Loader';
+import { io } from 'socket.io-client';
 import { toast, ToastContainer } from 'react-toastify';
 import 'react-toastify/dist/ReactToastify.css';
 import './Snapshots.css';
@@ -185,10 +186,12 @@ const SnapshotItem = ({ snapshot, onImageClick }) => {
   };
 
   useEffect(() => {
-    if (snapshot.image_path) {
-      fetchImageForGrid(snapshot.image_path);
+    // The grid only needs the small cached thumbnail; the full image is loaded in fullscreen
+    const gridImagePath = snapshot.thumbnail_url || snapshot.image_path;
+    if (gridImagePath) {
+      fetchImageForGrid(gridImagePath);
     }
-  }, [snapshot.image_path]);
+  }, [snapshot.thumbnail_url, snapshot.image_path]);
 
   return (
     <div key={snapshot.id} className="snapshot-item">
@@ -249,6 +252,36 @@ function Snapshots() {
     fetchSnapshots();
   }, [page, blacklisted, sortOrder, startDate, endDate]);
 
+  // The socket handler outlives renders; read the fetch with the current filters through a ref
+  const fetchSnapshotsRef = useRef(fetchSnapshots);
+  fetchSnapshotsRef.current = fetchSnapshots;
+
+  // New snapshots are pushed by the backend; only the newest-first, unfiltered first page changes.
+  // New snapshots are never blacklisted yet, so the blacklisted-only view does not change either
+  const isLiveView = page === 1 && sortOrder === 'desc' && !blacklisted && !startDate && !endDate;
+  useEffect(() => {
+    if (!isLiveView) return undefined;
+    const socket = io(process.env.REACT_APP_API_BASE_URL, {
+      extraHeaders: { 'Ngrok-Skip-Browser-Warning': 'true' },
+    });
+    socket.on('connect', () => socket.emit('subscribe', { topics: ['snapshots'] }));
+    socket.on('live_update', (update, ack) => {
+      if (ack) ack();
+      if (update.dropped_snapshots) {
+        // More arrived than one bundle carries: reload the page instead of merging
+        fetchSnapshotsRef.current();
+        return;
+      }
+      const incoming = (update.snapshots || []).slice().reverse();
+      if (!incoming.length) return;
+      setSnapshots((previous) => {
+        const known = new Set(previous.map((item) => item.id));
+        return [...incoming.filter((item) => !known.has(item.id)), ...previous].slice(0, 25);
+      });
+    });
+    return () => socket.disconnect();
+  }, [isLiveView]);
+
   const handleImageClick = (imagePath, id) => {
     setFullscreenImagePath(imagePath);
     setFullscreenSnapshotId(id);